@@ -0,0 +1,101 @@
+# Micro-benchmark dell'estrazione HTML: confronta il modulo `extractor` (lxml + unpacker
+# diretto) con il percorso precedente (BeautifulSoup html.parser + jsbeautifier) sulle
+# pagine salvate in benchmarks/fixtures/. Verifica anche che i risultati coincidano.
+#
+# Uso:
+#   python benchmarks/bench_extractor.py [--repeat 50] [--json risultati.json] [--min-speedup 1.5]
+# Si possono aggiungere pagine reali salvate nella cartella fixtures, purché il nome
+# inizi con il tipo di pagina (player*, search*, series*, seasons*, episodes*).
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import jsbeautifier
+from bs4 import BeautifulSoup
+
+import extractor
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+# --- Implementazioni precedenti, usate come riferimento ---
+
+def baseline_m3u8(html: str) -> str | None:
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup.find_all("script", string=re.compile("eval")):
+        data_js = jsbeautifier.beautify(script.string)
+        match = re.search(r'sources:\s*\[\{\s*src:\s*"([^"]+)"', data_js)
+        if match: return match.group(1)
+    return None
+
+def baseline_search(html: str) -> list[dict]:
+    soup = BeautifulSoup(html, 'html.parser')
+    results = []
+    for item in soup.find_all('div', class_='movie'):
+        title_tag, link_tag = item.find('h2'), item.find('a')
+        if title_tag and link_tag:
+            results.append({'title': title_tag.text.strip(), 'link': link_tag['href'],
+                            'type': "Serie TV" if "/serietv/" in link_tag['href'] else "Film"})
+    return results
+
+def baseline_title(html: str) -> str | None:
+    h1 = BeautifulSoup(html, 'html.parser').find('h1')
+    return h1.text.strip() if h1 else None
+
+def baseline_links(container_class: str):
+    def run(html: str) -> list[tuple[str, str]]:
+        soup = BeautifulSoup(html, 'html.parser')
+        return [(a['href'], a.text.strip()) for a in soup.select(f'div.{container_class} a[href]')]
+    return run
+
+CASES = {
+    'player': (baseline_m3u8, extractor.extract_m3u8),
+    'search': (baseline_search, extractor.parse_search_results),
+    'series': (baseline_title, extractor.extract_title),
+    'seasons': (baseline_links('div_seasons'), lambda html: extractor.extract_links(html, 'div_seasons')),
+    'episodes': (baseline_links('div_episodes'), lambda html: extractor.extract_links(html, 'div_episodes')),
+}
+
+def _time_per_call(fn, html: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat): fn(html)
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark dell'estrazione HTML sulle pagine di fixtures/.")
+    parser.add_argument('--repeat', type=int, default=50, help='Chiamate per misura (si tiene la migliore di 3).')
+    parser.add_argument('--json', type=str, help='Salva i risultati in questo file JSON.')
+    parser.add_argument('--min-speedup', type=float, default=0.0, help='Esce con errore se uno speedup è inferiore a questa soglia.')
+    args = parser.parse_args()
+
+    rows, failed = [], False
+    for path in sorted(FIXTURES_DIR.glob('*.html')):
+        kind = next((k for k in CASES if path.stem.startswith(k)), None)
+        if kind is None: continue
+        html = path.read_text(encoding='utf-8')
+        baseline, current = CASES[kind]
+        same = baseline(html) == current(html)
+        old_ms = _time_per_call(baseline, html, args.repeat) * 1000
+        new_ms = _time_per_call(current, html, args.repeat) * 1000
+        speedup = old_ms / new_ms if new_ms else float('inf')
+        failed |= not same or speedup < args.min_speedup
+        rows.append({'fixture': path.name, 'kind': kind, 'bytes': len(html), 'baseline_ms': round(old_ms, 3),
+                     'extractor_ms': round(new_ms, 3), 'speedup': round(speedup, 2), 'same_result': same})
+
+    print(f"{'Fixture':<16} {'KiB':>5} {'prima (ms)':>11} {'ora (ms)':>9} {'speedup':>8}  risultato")
+    for r in rows:
+        print(f"{r['fixture']:<16} {r['bytes'] // 1024:>5} {r['baseline_ms']:>11.3f} {r['extractor_ms']:>9.3f} {r['speedup']:>7.1f}x  {'ok' if r['same_result'] else 'DIVERSO'}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({'repeat': args.repeat, 'results': rows}, indent=2), encoding='utf-8')
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+# Benchmark end-to-end offline: avvia una copia locale del sito (sitegen.StandInSite)
+# e misura i tempi delle fasi di ricerca, enumerazione, estrazione e download su serie
+# di dimensioni configurabili, senza contattare il sito reale.
+#
+# Modalità:
+#   - http (default): le pagine vengono scaricate con curl_cffi e analizzate con lo stesso
+#     codice di main2 (extractor); misura parsing, latenza di rete e download.
+#   - --browser: le fasi passano per Camoufox e per le funzioni di main2
+#     (search_content, load_series_catalog, get_m3u8_link...), come in un'esecuzione reale.
+# Il download usa download_m3u8_to_mp4 di main2 se ffmpeg è disponibile (con segmenti
+# video reali generati da ffmpeg), altrimenti misura il solo trasferimento dei segmenti.
+#
+# Uso:
+#   python benchmarks/bench_offline.py --sizes 1x6,2x12 --jobs 2 --engine native --json bench.json
+#   python benchmarks/bench_offline.py --compare bench_prima.json --json bench_dopo.json
+
+import argparse
+import asyncio
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+import lxml.html
+from curl_cffi.requests import AsyncSession
+
+import extractor
+import hls
+import main2
+import sitegen
+from page_pool import PagePool
+
+def _stage(seconds: float, items: int, **extra) -> dict:
+    return {'seconds': round(seconds, 4), 'items': items, 'items_per_s': round(items / seconds, 2) if seconds else None, **extra}
+
+def _iframe_src(html: str, needle: str) -> str | None:
+    found = lxml.html.fromstring(html).xpath(f"//iframe[contains(@src, '{needle}')]/@src")
+    return found[0] if found else None
+
+def _generate_media(ffmpeg: str, out_dir: Path, segments: int, segment_seconds: float, segment_bytes: int) -> None:
+    """Genera con ffmpeg una playlist HLS reale (video di prova) delle dimensioni richieste."""
+    kbps = max(64, int(segment_bytes * 8 / segment_seconds / 1000))
+    cmd = [ffmpeg, "-loglevel", "error", "-y", "-f", "lavfi", "-i", "testsrc=size=640x360:rate=25", "-f", "lavfi", "-i", "sine=frequency=440",
+           "-t", str(segments * segment_seconds), "-c:v", "libx264", "-preset", "ultrafast", "-b:v", f"{kbps}k",
+           "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})", "-c:a", "aac",
+           "-f", "hls", "-hls_time", str(segment_seconds), "-hls_list_size", "0",
+           "-hls_segment_filename", str(out_dir / "seg%d.ts"), str(out_dir / "index.m3u8")]
+    subprocess.run(cmd, check=True)
+
+# --- Fasi in modalità http ---
+
+async def _http_stages(site: sitegen.StandInSite, args) -> tuple[dict, list[tuple[int, int, str]]]:
+    stages = {}
+    async with AsyncSession(impersonate=hls.IMPERSONATE) as session:
+        start = time.perf_counter()
+        r = await session.get(f"{main2.SEARCH_URL}esempio")
+        results = extractor.parse_search_results(r.text)
+        stages['search'] = _stage(time.perf_counter() - start, len(results))
+
+        start = time.perf_counter()
+        series_html = (await session.get(site.series_url(0))).text
+        extractor.extract_title(series_html)
+        selection_url = _iframe_src(series_html, 'streaming-serie-tv')
+        seasons = extractor.extract_links((await session.get(selection_url)).text, 'div_seasons')
+        episodes = []
+        for season_href, _ in seasons:
+            for href, _ in extractor.extract_links((await session.get(season_href)).text, 'div_episodes'):
+                parsed = main2._parse_href(href)
+                if parsed and len(parsed) == 3: episodes.append((parsed[1], parsed[2], href))
+        stages['enumeration'] = _stage(time.perf_counter() - start, len(episodes), navigations=1 + len(seasons) + 1)
+
+        semaphore = asyncio.Semaphore(max(1, args.pages))
+        async def _extract(ep_url: str) -> str | None:
+            async with semaphore:
+                player_url = _iframe_src((await session.get(ep_url)).text, 'flexy.stream')
+                return extractor.extract_m3u8((await session.get(player_url)).text) if player_url else None
+
+        start = time.perf_counter()
+        links = await asyncio.gather(*(_extract(url) for _, _, url in episodes))
+        resolved = [(s, e, m3u8) for (s, e, _), m3u8 in zip(episodes, links) if m3u8]
+        stages['extraction'] = _stage(time.perf_counter() - start, len(resolved))
+    return stages, resolved
+
+# --- Fasi in modalità browser ---
+
+async def _browser_stages(site: sitegen.StandInSite, args) -> tuple[dict, list[tuple[int, int, str]]]:
+    from camoufox import AsyncCamoufox
+
+    stages = {}
+    async with AsyncCamoufox(headless=True) as browser:
+        context = await browser.new_context()
+        pool = await PagePool(context, args.pages).start()
+        async with pool.acquire() as page:
+            start = time.perf_counter()
+            results = await main2.search_content(page, "esempio")
+            stages['search'] = _stage(time.perf_counter() - start, len(results))
+
+        start = time.perf_counter()
+        series = await main2.load_series_catalog(pool, site.series_url(0))
+        episodes = []
+        for season_href, _ in (series or {}).get('seasons', []):
+            for _, s_num, e_num, href, _ in await main2.load_season_episodes(pool, site.series_url(0), season_href):
+                episodes.append((s_num, e_num, href))
+        stages['enumeration'] = _stage(time.perf_counter() - start, len(episodes))
+
+        async def _extract(s_num: int, e_num: int, ep_url: str) -> str | None:
+            async with pool.acquire() as page:
+                return await main2.get_m3u8_link(page, ep_url, s_num, e_num)
+
+        start = time.perf_counter()
+        links = await asyncio.gather(*(_extract(*ep) for ep in episodes))
+        resolved = [(s, e, m3u8) for (s, e, _), m3u8 in zip(episodes, links) if m3u8]
+        stages['extraction'] = _stage(time.perf_counter() - start, len(resolved), recycled_pages=pool.recycled)
+        await pool.close()
+    return stages, resolved
+
+# --- Download ---
+
+async def _download_stage(site: sitegen.StandInSite, resolved: list[tuple[int, int, str]], args, out_dir: Path) -> dict:
+    sent_before = site.bytes_sent
+    start = time.perf_counter()
+    if args.transfer_only:
+        semaphore = asyncio.Semaphore(max(1, args.jobs))
+        async def _transfer(m3u8: str) -> None:
+            async with semaphore, hls.new_session(main2.PLAYER_REFERER, args.segment_concurrency) as session:
+                playlist = await hls.load_media_playlist(session, m3u8)
+                async def _discard(seg, data): pass
+                await hls.download_segments(session, playlist, _discard, args.segment_concurrency)
+        await asyncio.gather(*(_transfer(m3u8) for _, _, m3u8 in resolved))
+        completed = len(resolved)
+    else:
+        queue: asyncio.Queue = asyncio.Queue()
+        for s_num, e_num, m3u8 in resolved:
+            queue.put_nowait((m3u8, out_dir / f"S{s_num:02d}E{e_num:02d}.mp4"))
+        workers = [asyncio.create_task(main2._download_worker(queue)) for _ in range(max(1, args.jobs))]
+        for _ in workers: queue.put_nowait(None)
+        await asyncio.gather(*workers)
+        completed = sum(1 for f in out_dir.glob("*.mp4") if f.stat().st_size > 0)
+    seconds = time.perf_counter() - start
+    transferred = site.bytes_sent - sent_before
+    return _stage(seconds, completed, bytes=transferred, mb_per_s=round(transferred / seconds / 1e6, 2) if seconds else None,
+                  mode='transfer-only' if args.transfer_only else f"ffmpeg/{args.engine}")
+
+async def run_size(seasons: int, episodes: int, args, media_dir: Path | None) -> dict:
+    with sitegen.StandInSite(seasons=seasons, episodes=episodes, segments=args.segments, segment_seconds=args.segment_seconds,
+                             segment_bytes=args.segment_kib * 1024, latency_ms=args.latency_ms, hls_dir=media_dir) as site:
+        main2.BASE_URL = site.base_url
+        main2.SEARCH_URL = f"{site.base_url}/?s="
+        main2.PLAYER_REFERER = f"{site.base_url}/flexy.stream/"
+        main2.PLAYER_HOSTS = (*main2.PLAYER_HOSTS, "127.0.0.1")
+        total_start = time.perf_counter()
+        stages, resolved = await (_browser_stages(site, args) if args.browser else _http_stages(site, args))
+        with tempfile.TemporaryDirectory() as tmp:
+            stages['download'] = await _download_stage(site, resolved, args, Path(tmp))
+        return {'size': f"{seasons}x{episodes}", 'episodes': seasons * episodes, 'stages': stages,
+                'total_seconds': round(time.perf_counter() - total_start, 4), 'requests': site.requests}
+
+def _git_commit() -> str | None:
+    try: return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception: return None
+
+def _print_report(report: dict, previous: dict | None) -> None:
+    old_runs = {r['size']: r for r in (previous or {}).get('runs', [])}
+    print(f"\n{'Serie':<7} {'Fase':<12} {'Secondi':>9} {'Elementi':>9} {'El./s':>8} {'MB/s':>7} {'Prima':>9} {'Delta':>8}")
+    for run in report['runs']:
+        for name, stage in run['stages'].items():
+            old = old_runs.get(run['size'], {}).get('stages', {}).get(name)
+            delta = f"{(stage['seconds'] / old['seconds'] - 1) * 100:+.0f}%" if old and old['seconds'] else ""
+            print(f"{run['size']:<7} {name:<12} {stage['seconds']:>9.3f} {stage['items']:>9} {stage['items_per_s'] or 0:>8.1f} "
+                  f"{stage.get('mb_per_s') or '':>7} {old['seconds'] if old else '':>9} {delta:>8}")
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark end-to-end su una copia locale del sito.')
+    parser.add_argument('--sizes', type=str, default='1x6', help="Dimensioni delle serie come stagioni x episodi, separate da virgole (es. 1x6,4x12).")
+    parser.add_argument('--segments', type=int, default=10, help='Segmenti HLS per episodio.')
+    parser.add_argument('--segment-seconds', type=float, default=4.0)
+    parser.add_argument('--segment-kib', type=int, default=256, help='Dimensione indicativa di un segmento in KiB.')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latenza aggiunta dal server a ogni richiesta.')
+    parser.add_argument('--browser', action='store_true', help='Usa Camoufox e le funzioni di navigazione di main2.')
+    parser.add_argument('--pages', type=int, default=1, help='Estrazioni in parallelo (schede del browser in modalità --browser).')
+    parser.add_argument('--jobs', type=int, default=1, help='Download in parallelo.')
+    parser.add_argument('--engine', choices=['ffmpeg', 'native'], default='ffmpeg')
+    parser.add_argument('--segment-concurrency', type=int, default=8)
+    parser.add_argument('--ffmpeg', type=str, default=shutil.which('ffmpeg'), help='Percorso di ffmpeg (default: dal PATH).')
+    parser.add_argument('--transfer-only', action='store_true', help='Misura solo il trasferimento dei segmenti, senza ffmpeg.')
+    parser.add_argument('--json', type=str, help='File JSON in cui salvare i risultati.')
+    parser.add_argument('--compare', type=str, help='JSON di un\'esecuzione precedente da confrontare.')
+    args = parser.parse_args()
+
+    sizes = [tuple(int(n) for n in size.lower().split('x', 1)) for size in args.sizes.split(',') if size.strip()]
+    if not args.ffmpeg: args.transfer_only = True
+    main2.PROGRESS.render = False
+    main2.SKIP_EXISTING = False
+    main2.FFMPEG_BIN_PATH = args.ffmpeg
+    main2.FFPROBE_BIN_PATH = shutil.which('ffprobe', path=str(Path(args.ffmpeg).parent)) if args.ffmpeg else None
+    main2.DOWNLOAD_ENGINE = args.engine
+    main2.SEGMENT_CONCURRENCY = max(1, args.segment_concurrency)
+
+    report = {'commit': _git_commit(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'mode': 'browser' if args.browser else 'http',
+              'config': {k: v for k, v in vars(args).items() if k not in ('json', 'compare')}, 'runs': []}
+    with tempfile.TemporaryDirectory() as media_tmp:
+        media_dir = None
+        if not args.transfer_only:
+            media_dir = Path(media_tmp)
+            _generate_media(args.ffmpeg, media_dir, args.segments, args.segment_seconds, args.segment_kib * 1024)
+        for seasons, episodes in sizes:
+            report['runs'].append(await run_size(seasons, episodes, args, media_dir))
+
+    previous = json.loads(Path(args.compare).read_text(encoding='utf-8')) if args.compare else None
+    _print_report(report, previous)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
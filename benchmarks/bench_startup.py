@@ -0,0 +1,94 @@
+# Benchmark dell'avvio a freddo: misura `main2.py --help`, l'import di main2 (verificando che
+# le dipendenze pesanti non vengano caricate), e la ricerca di ffmpeg/ffprobe e dell'addon del
+# browser con e senza i percorsi salvati in cache.
+#
+# Uso:
+#   python benchmarks/bench_startup.py [--repeat 5] [--json avvio.json] [--max-help-ms 600]
+# Esce con errore se `import main2` carica un modulo pesante o se --help supera la soglia.
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+# Moduli che devono essere importati solo quando servono davvero.
+HEAVY_MODULES = ('camoufox', 'playwright', 'playwright_captcha', 'curl_cffi', 'tqdm', 'bs4', 'jsbeautifier')
+
+def _run_ms(cmd: list[str], repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def _summary(times: list[float]) -> dict:
+    return {'min_ms': round(min(times), 1), 'median_ms': round(statistics.median(times), 1)}
+
+def _heavy_modules_after_import() -> list[str]:
+    code = f"import sys, json, main2; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def _tool_discovery(repeat: int) -> dict:
+    """ensure_ffmpeg con la cache dei percorsi vuota (ricerca completa) e già popolata."""
+    import shutil
+    import cache
+    import main2
+
+    installed = (shutil.which('ffmpeg') and shutil.which('ffprobe')) or None not in main2._resolve_ffmpeg_binaries(REPO_DIR / 'bin')
+    if not installed: return {'skipped': "ffmpeg non installato (il benchmark non lo scarica)"}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'tools.sqlite'
+        main2.ToolCache = lambda: cache.ToolCache(db_path)
+        cold, cached = [], []
+        for _ in range(repeat):
+            db_path.unlink(missing_ok=True)
+            for bucket in (cold, cached):
+                main2.FFMPEG_BIN_PATH = main2.FFPROBE_BIN_PATH = None
+                start = time.perf_counter()
+                main2.ensure_ffmpeg()
+                bucket.append((time.perf_counter() - start) * 1000)
+        return {'cold': _summary(cold), 'cached': _summary(cached)}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark dell'avvio a freddo di main2.py.")
+    parser.add_argument('--repeat', type=int, default=5, help='Ripetizioni per misura (si riportano minimo e mediana).')
+    parser.add_argument('--json', type=str, help='Salva i risultati in questo file JSON.')
+    parser.add_argument('--max-help-ms', type=float, default=0.0, help='Esce con errore se la mediana di --help supera questa soglia.')
+    args = parser.parse_args()
+
+    results = {
+        'help': _summary(_run_ms([sys.executable, "main2.py", "--help"], args.repeat)),
+        'import_main2': _summary(_run_ms([sys.executable, "-c", "import main2"], args.repeat)),
+        'python_baseline': _summary(_run_ms([sys.executable, "-c", "pass"], args.repeat)),
+        'heavy_modules_loaded': _heavy_modules_after_import(),
+        'addon_import': _summary(_run_ms([sys.executable, "-c", "from playwright_captcha.utils.camoufox_add_init_script.add_init_script import get_addon_path; get_addon_path()"], args.repeat)),
+        'ffmpeg_discovery': _tool_discovery(args.repeat),
+    }
+
+    print(f"{'Misura':<22} {'min (ms)':>9} {'mediana (ms)':>13}")
+    for name in ('python_baseline', 'import_main2', 'help', 'addon_import'):
+        print(f"{name:<22} {results[name]['min_ms']:>9.1f} {results[name]['median_ms']:>13.1f}")
+    discovery = results['ffmpeg_discovery']
+    if 'skipped' in discovery: print(f"{'ffmpeg_discovery':<22} {discovery['skipped']}")
+    else:
+        for kind in ('cold', 'cached'):
+            print(f"{'ffmpeg_' + kind:<22} {discovery[kind]['min_ms']:>9.1f} {discovery[kind]['median_ms']:>13.1f}")
+    heavy = results['heavy_modules_loaded']
+    print(f"Moduli pesanti caricati da `import main2`: {', '.join(heavy) if heavy else 'nessuno'}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({'repeat': args.repeat, 'results': results}, indent=2), encoding='utf-8')
+    too_slow = args.max_help_ms and results['help']['median_ms'] > args.max_help_ms
+    return 1 if heavy or too_slow else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
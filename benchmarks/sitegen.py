@@ -0,0 +1,231 @@
+# Generatore delle pagine di esempio usate dai benchmark.
+# Riproduce la struttura delle pagine reali del sito (risultati di ricerca, pagina
+# della serie con l'iframe streaming-serie-tv, stagioni, episodi, iframe del player
+# con lo script offuscato p,a,c,k,e,d) senza contenuti reali.
+#
+# Contiene anche StandInSite, un server HTTP locale che serve le stesse pagine più una
+# playlist HLS sintetica, usato dal benchmark end-to-end offline (bench_offline.py).
+#
+# Uso: python benchmarks/sitegen.py   -> rigenera i file in benchmarks/fixtures/
+
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+EXAMPLE_BASE = "https://onlineserietv.example"
+EXAMPLE_M3U8 = "https://cdn.flexy.example/hls/v2/a1b2c3d4e5/master.m3u8?token=Zx81kQ2&expires=1767225600"
+
+_ALPHABET_62 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_PACKER_FN = (
+    "function(p,a,c,k,e,d){e=function(c){return(c<a?'':e(parseInt(c/a)))+((c=c%a)>35?String.fromCharCode(c+29):c.toString(36))};"
+    "if(!''.replace(/^/,String)){while(c--){d[e(c)]=k[c]||e(c)}k=[function(e){return d[e]}];e=function(){return'\\\\w+'};c=1};"
+    "while(c--){if(k[c]){p=p.replace(new RegExp('\\\\b'+e(c)+'\\\\b','g'),k[c])}}return p}"
+)
+
+def _base62(n: int) -> str:
+    return _ALPHABET_62[n] if n < 62 else _base62(n // 62) + _ALPHABET_62[n % 62]
+
+def pack(source: str) -> str:
+    """Offusca `source` con lo schema di Dean Edwards (base 62), come il player reale."""
+    words = Counter(re.findall(r"\b\w+\b", source, re.ASCII))
+    ordered = [w for w, _ in words.most_common()]
+    index = {w: _base62(i) for i, w in enumerate(ordered)}
+    payload = re.sub(r"\b\w+\b", lambda m: index[m.group(0)], source, flags=re.ASCII)
+    payload = payload.replace("\\", "\\\\").replace("'", "\\'")
+    keywords = "|".join("" if index[w] == w else w for w in ordered)
+    return f"eval({_PACKER_FN}('{payload}',62,{len(ordered)},'{keywords}'.split('|'),0,{{}}))"
+
+def _filler_script(rng: random.Random, entries: int) -> str:
+    config = {f"k{i}": {"id": rng.randrange(10**6), "label": f"item-{i}", "flags": [rng.random() > .5 for _ in range(4)]} for i in range(entries)}
+    return f"window.__CONFIG__ = {json.dumps(config)};"
+
+def _layout(title: str, body: str, head: str = "") -> str:
+    menu = "".join(f'<li class="menu-item"><a href="{EXAMPLE_BASE}/genere/{g}/">{g.title()}</a></li>' for g in
+                   ("azione", "animazione", "avventura", "commedia", "crime", "documentario", "drammatico", "fantascienza", "horror", "thriller"))
+    return (
+        f'<!DOCTYPE html><html lang="it"><head><meta charset="utf-8"><title>{title}</title>'
+        f'<link rel="stylesheet" href="{EXAMPLE_BASE}/wp-content/themes/style.css">{head}</head>'
+        f'<body><header id="header"><nav><ul class="menu">{menu}</ul></nav></header>'
+        f'<div id="content">{body}</div><footer id="footer"><p>&copy; onlineserietv</p></footer></body></html>'
+    )
+
+def search_page(query: str, results: list[tuple[str, str]], base: str = EXAMPLE_BASE) -> str:
+    """Pagina `?s=`: `results` è una lista di (titolo, percorso relativo come 'serietv/slug/')."""
+    items = "".join(
+        f'<div class="movie"><div class="imagen"><a href="{base}/{path}"><img src="{base}/img/{i}.jpg" alt=""></a></div>'
+        f'<h2>{title}</h2><span class="year">20{10 + i % 15}</span></div>'
+        for i, (title, path) in enumerate(results))
+    return _layout(f"Hai cercato {query}", f'<h1>Risultati per: {query}</h1><div id="box_movies">{items}</div>')
+
+def series_page(title: str, series_id: int, base: str = EXAMPLE_BASE) -> str:
+    rng = random.Random(series_id)
+    plot = " ".join(rng.choice(("lorem", "ipsum", "dolor", "sit", "amet", "serie", "stagione", "episodio")) for _ in range(400))
+    body = (f'<h1>{title}</h1><div class="sinopsis"><p>{plot}</p></div>'
+            f'<iframe src="{base}/streaming-serie-tv/{series_id}/" width="100%" height="400"></iframe>')
+    return _layout(f"{title} - Streaming", body, f"<script>{_filler_script(rng, 200)}</script>")
+
+def seasons_page(series_id: int, seasons: int, base: str = EXAMPLE_BASE) -> str:
+    links = "".join(f'<a href="{base}/streaming-serie-tv/{series_id}/{s}/0/">Stagione {s}</a>' for s in range(1, seasons + 1))
+    return f'<html><body><div class="div_seasons">{links}</div></body></html>'
+
+def episodes_page(series_id: int, season: int, episodes: int, base: str = EXAMPLE_BASE) -> str:
+    seasons_links = f'<div class="div_seasons"><a href="{base}/streaming-serie-tv/{series_id}/{season}/0/">Stagione {season}</a></div>'
+    links = "".join(f'<a href="{base}/streaming-serie-tv/{series_id}/{season}/{e}/">Episodio {e}</a>' for e in range(1, episodes + 1))
+    return f'<html><body>{seasons_links}<div class="div_episodes">{links}</div></body></html>'
+
+def player_page(m3u8_url: str = EXAMPLE_M3U8, seed: int = 0) -> str:
+    """Contenuto dell'iframe del player: uno script pubblicitario offuscato e quello con `sources`."""
+    rng = random.Random(seed)
+    ads = pack('var ad_slots=["top","side","bottom"];function loadAds(){for(var i=0;i<ad_slots.length;i++){document.getElementById(ad_slots[i]).className="ad-loaded"}}loadAds();')
+    player = pack(
+        'var player=videojs("vjs-player",{controls:true,autoplay:false,preload:"auto",fluid:true,playbackRates:[0.5,1,1.5,2]});'
+        f'player.ready(function(){{this.src({{sources:[{{src:"{m3u8_url}",type:"application/x-mpegURL"}}]}});'
+        'this.on("error",function(){var err=this.error();console.log("player error",err.code,err.message)});'
+        'this.on("ended",function(){window.parent.postMessage({event:"ended"},"*")})});'
+    )
+    return (f'<head><meta charset="utf-8"><script>{_filler_script(rng, 400)}</script><script>{ads}</script></head>'
+            f'<body><div id="top"></div><div class="video-js" id="vjs-player"></div><div id="side"></div>'
+            f'<script>{player}</script></body>')
+
+def episode_page(title: str, player_url: str) -> str:
+    """Pagina di un episodio o di un film: selettore del player (Flexy già attivo) e iframe."""
+    body = (f'<h1>{title}</h1><select name="sel_player"><option value="fx" selected>Flexy</option>'
+            f'<option value="mx">MaxStream</option></select>'
+            f'<iframe src="{player_url}" width="640" height="360" allowfullscreen></iframe>')
+    return _layout(title, body)
+
+def media_playlist(segments: int, segment_seconds: float) -> str:
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{int(segment_seconds + 0.999)}", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for i in range(segments):
+        lines += [f"#EXTINF:{segment_seconds:.3f},", f"seg{i}.ts"]
+    return "\n".join(lines + ["#EXT-X-ENDLIST", ""])
+
+class StandInSite:
+    """
+    Copia locale del sito su 127.0.0.1, con lo stesso schema di URL di quello reale:
+      /?s=<titolo>                                  risultati di ricerca (div#box_movies)
+      /serietv/serie-di-esempio-<n>/                pagina della serie con l'iframe streaming-serie-tv
+      /film/film-di-esempio-<n>/                    pagina di un film
+      /streaming-serie-tv/<id>/                     elenco stagioni
+      /streaming-serie-tv/<id>/<s>/0/               elenco episodi della stagione
+      /streaming-serie-tv/<id>/<s>/<e>/             pagina dell'episodio con l'iframe del player
+      /flexy.stream/e/<chiave>                      iframe del player con lo script offuscato
+      /hls/<chiave>/index.m3u8, /hls/<chiave>/segN.ts   playlist e segmenti
+    Se `hls_dir` contiene una playlist generata da ffmpeg (index.m3u8 + segmenti) vengono
+    serviti quei file, altrimenti una playlist sintetica con segmenti di byte casuali.
+    """
+
+    def __init__(self, seasons: int = 1, episodes: int = 6, segments: int = 10, segment_seconds: float = 4.0,
+                 segment_bytes: int = 256 * 1024, latency_ms: float = 0, hls_dir: Path | None = None, results: int = 20):
+        self.seasons, self.episodes, self.results = seasons, episodes, results
+        self.latency = latency_ms / 1000
+        self.hls_dir = hls_dir
+        if hls_dir is not None:
+            self.playlist = (hls_dir / 'index.m3u8').read_text(encoding='utf-8')
+        else:
+            self.playlist = media_playlist(segments, segment_seconds)
+            self.segment = os.urandom(segment_bytes)
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def series_url(self, n: int = 0) -> str:
+        return f"{self.base_url}/serietv/serie-di-esempio-{n}/"
+
+    def _route(self, path: str, query: dict) -> tuple[int, str, bytes]:
+        base = self.base_url
+        html = lambda text: (200, 'text/html; charset=utf-8', text.encode('utf-8'))
+        if path == '/' and 's' in query:
+            results = [(f"Serie di esempio {i}", f"serietv/serie-di-esempio-{i}/") for i in range(self.results)]
+            results += [(f"Film di esempio {i}", f"film/film-di-esempio-{i}/") for i in range(self.results)]
+            return html(search_page(query['s'][0], results, base))
+        if m := re.fullmatch(r'/serietv/serie-di-esempio-(\d+)/', path):
+            return html(series_page(f"Serie di esempio {m.group(1)}", 1000 + int(m.group(1)), base))
+        if m := re.fullmatch(r'/film/film-di-esempio-(\d+)/', path):
+            return html(episode_page(f"Film di esempio {m.group(1)}", f"{base}/flexy.stream/e/film-{m.group(1)}"))
+        if m := re.fullmatch(r'/streaming-serie-tv/(\d+)/', path):
+            return html(seasons_page(int(m.group(1)), self.seasons, base))
+        if m := re.fullmatch(r'/streaming-serie-tv/(\d+)/(\d+)/0/', path):
+            return html(episodes_page(int(m.group(1)), int(m.group(2)), self.episodes, base))
+        if m := re.fullmatch(r'/streaming-serie-tv/(\d+)/(\d+)/(\d+)/', path):
+            sid, season, episode = m.groups()
+            return html(episode_page(f"S{int(season):02d}E{int(episode):02d}", f"{base}/flexy.stream/e/{sid}-{season}-{episode}"))
+        if m := re.fullmatch(r'/flexy\.stream/e/([\w-]+)', path):
+            return html(player_page(f"{base}/hls/{m.group(1)}/index.m3u8"))
+        if re.fullmatch(r'/hls/[\w-]+/index\.m3u8', path):
+            return 200, 'application/vnd.apple.mpegurl', self.playlist.encode('utf-8')
+        if m := re.fullmatch(r'/hls/[\w-]+/([\w.-]+\.ts)', path):
+            if self.hls_dir is None: return 200, 'video/mp2t', self.segment
+            segment = self.hls_dir / m.group(1)
+            if segment.is_file(): return 200, 'video/mp2t', segment.read_bytes()
+        return 404, 'text/plain', b'not found'
+
+    def start(self) -> 'StandInSite':
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self, with_body: bool) -> None:
+                if site.latency: time.sleep(site.latency)
+                url = urllib.parse.urlsplit(self.path)
+                status, ctype, body = site._route(url.path, urllib.parse.parse_qs(url.query))
+                self.send_response(status)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if with_body: self.wfile.write(body)
+                with site._lock:
+                    site.requests += 1
+                    site.bytes_sent += len(body) if with_body else 0
+
+            def do_GET(self): self._respond(True)
+            def do_HEAD(self): self._respond(False)
+            def log_message(self, *args): pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self) -> 'StandInSite':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def write_fixtures() -> None:
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    results = [(f"Serie di esempio {i}", f"serietv/serie-di-esempio-{i}/") for i in range(20)]
+    results += [(f"Film di esempio {i}", f"film/film-di-esempio-{i}/") for i in range(20)]
+    pages = {
+        'search.html': search_page("esempio", results),
+        'series.html': series_page("Serie di esempio", 4321),
+        'seasons.html': seasons_page(4321, 8),
+        'episodes.html': episodes_page(4321, 1, 24),
+        'player.html': player_page(),
+    }
+    for name, html in pages.items():
+        (FIXTURES_DIR / name).write_text(html, encoding='utf-8')
+        print(f"{name}: {len(html) // 1024} KiB")
+
+if __name__ == "__main__":
+    write_fixtures()
@@ -0,0 +1,190 @@
+# Cache persistente su SQLite per i dati del sito che cambiano di rado.
+# Il catalogo di una serie (titolo, stagioni, episodi) viene salvato dopo la prima
+# enumerazione, così le esecuzioni successive non devono ripercorrere tutte le pagine.
+# Anche i link M3U8 già risolti vengono conservati, per evitare di ripetere l'estrazione,
+# così come i percorsi degli strumenti esterni (ffmpeg, ffprobe, addon del browser).
+
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parent / 'cache' / 'onlineserietv.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    selection_url TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seasons (
+    series_url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    href TEXT NOT NULL,
+    label TEXT NOT NULL,
+    episodes_fetched_at REAL,
+    PRIMARY KEY (series_url, href)
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    series_url TEXT NOT NULL,
+    season_href TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    series_id INTEGER NOT NULL,
+    season INTEGER NOT NULL,
+    episode INTEGER NOT NULL,
+    href TEXT NOT NULL,
+    label TEXT NOT NULL,
+    PRIMARY KEY (series_url, href)
+);
+CREATE TABLE IF NOT EXISTS movies (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS links (
+    page_url TEXT NOT NULL,
+    season INTEGER NOT NULL,
+    episode INTEGER NOT NULL,
+    m3u8_url TEXT NOT NULL,
+    title TEXT,
+    resolved_at REAL NOT NULL,
+    PRIMARY KEY (page_url, season, episode)
+);
+CREATE TABLE IF NOT EXISTS tools (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mtime REAL NOT NULL
+);
+"""
+
+def open_db(db_path: Path = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+class CatalogCache:
+    """
+    Mappa l'URL di una serie su titolo, pagina di selezione, stagioni ed episodi
+    (series_id, stagione, episodio, href) e l'URL di un film sul suo titolo. Ogni lista ha un TTL indipendente;
+    con `refresh=True` le letture vengono ignorate ma i dati nuovi vengono comunque salvati.
+    """
+
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH, ttl_seconds: float = 24 * 3600, refresh: bool = False):
+        self.conn = open_db(db_path)
+        self.conn.executescript(_SCHEMA)
+        self.ttl_seconds = ttl_seconds
+        self.refresh = refresh
+
+    def _is_fresh(self, fetched_at: float | None) -> bool:
+        return not self.refresh and fetched_at is not None and time.time() - fetched_at < self.ttl_seconds
+
+    def get_series(self, url: str) -> dict | None:
+        row = self.conn.execute("SELECT title, selection_url, fetched_at FROM series WHERE url = ?", (url,)).fetchone()
+        if not row or not self._is_fresh(row[2]): return None
+        seasons = self.conn.execute("SELECT href, label FROM seasons WHERE series_url = ? ORDER BY position", (url,)).fetchall()
+        return {'title': row[0], 'selection_url': row[1], 'seasons': seasons}
+
+    def put_series(self, url: str, title: str, selection_url: str, seasons: list[tuple[str, str]]) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?)", (url, title, selection_url, time.time()))
+            known = {href for (href,) in self.conn.execute("SELECT href FROM seasons WHERE series_url = ?", (url,))}
+            current = {href for href, _ in seasons}
+            self.conn.executemany("DELETE FROM seasons WHERE series_url = ? AND href = ?", [(url, h) for h in known - current])
+            self.conn.executemany("DELETE FROM episodes WHERE series_url = ? AND season_href = ?", [(url, h) for h in known - current])
+            for position, (href, label) in enumerate(seasons):
+                # Le stagioni già note conservano la data di lettura dei loro episodi.
+                self.conn.execute(
+                    "INSERT INTO seasons (series_url, position, href, label) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(series_url, href) DO UPDATE SET position = excluded.position, label = excluded.label",
+                    (url, position, href, label))
+
+    def find_series_url(self, title: str) -> str | None:
+        """URL della serie letta più di recente con questo titolo, anche se la voce è scaduta."""
+        row = self.conn.execute("SELECT url FROM series WHERE title = ? ORDER BY fetched_at DESC LIMIT 1", (title,)).fetchone()
+        return row[0] if row else None
+
+    def get_movie_title(self, url: str) -> str | None:
+        """Titolo (già ripulito per il file system) del film, anche se la voce è scaduta: serve solo a trovare il file su disco."""
+        row = self.conn.execute("SELECT title FROM movies WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def put_movie_title(self, url: str, title: str) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO movies VALUES (?, ?, ?)", (url, title, time.time()))
+
+    def get_episodes(self, series_url: str, season_href: str, stale_ok: bool = False) -> list[tuple[int, int, int, str, str]] | None:
+        """Episodi di una stagione; con `stale_ok` anche se scaduti (ma mai con `refresh`)."""
+        row = self.conn.execute("SELECT episodes_fetched_at FROM seasons WHERE series_url = ? AND href = ?", (series_url, season_href)).fetchone()
+        if not row or row[0] is None or not (self._is_fresh(row[0]) or (stale_ok and not self.refresh)): return None
+        return self.conn.execute(
+            "SELECT series_id, season, episode, href, label FROM episodes WHERE series_url = ? AND season_href = ? ORDER BY position",
+            (series_url, season_href)).fetchall()
+
+    def put_episodes(self, series_url: str, season_href: str, episodes: list[tuple[int, int, int, str, str]]) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM episodes WHERE series_url = ? AND season_href = ?", (series_url, season_href))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO episodes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(series_url, season_href, position, *episode) for position, episode in enumerate(episodes)])
+            self.conn.execute("UPDATE seasons SET episodes_fetched_at = ? WHERE series_url = ? AND href = ?", (time.time(), series_url, season_href))
+
+    def close(self) -> None:
+        self.conn.close()
+
+class LinkCache:
+    """
+    Link M3U8 risolti, indicizzati per URL della pagina e stagione/episodio, con l'istante
+    di risoluzione. Le voci più vecchie di `ttl_seconds` non vengono nemmeno restituite;
+    le altre vanno comunque verificate dal chiamante prima dell'uso.
+    """
+
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH, ttl_seconds: float = 12 * 3600):
+        self.conn = open_db(db_path)
+        self.conn.executescript(_SCHEMA)
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, page_url: str, season: int = 0, episode: int = 0) -> tuple[str, str | None] | None:
+        """Restituisce (m3u8_url, titolo della pagina) se la voce non è scaduta."""
+        row = self.conn.execute(
+            "SELECT m3u8_url, title, resolved_at FROM links WHERE page_url = ? AND season = ? AND episode = ?",
+            (page_url, season, episode)).fetchone()
+        if not row or time.time() - row[2] >= self.ttl_seconds: return None
+        return row[0], row[1]
+
+    def put(self, page_url: str, m3u8_url: str, season: int = 0, episode: int = 0, title: str | None = None) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?)", (page_url, season, episode, m3u8_url, title, time.time()))
+
+    def invalidate(self, page_url: str, season: int = 0, episode: int = 0) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM links WHERE page_url = ? AND season = ? AND episode = ?", (page_url, season, episode))
+
+    def close(self) -> None:
+        self.conn.close()
+
+class ToolCache:
+    """
+    Percorsi già individuati degli strumenti esterni. Una voce è valida finché il file (o la
+    cartella) esiste e ha la stessa data di modifica registrata; altrimenti va ricercata.
+    """
+
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH):
+        self.conn = open_db(db_path)
+        self.conn.executescript(_SCHEMA)
+
+    def get(self, name: str) -> str | None:
+        row = self.conn.execute("SELECT path, mtime FROM tools WHERE name = ?", (name,)).fetchone()
+        if not row: return None
+        try: return row[0] if os.stat(row[0]).st_mtime == row[1] else None
+        except OSError: return None
+
+    def put(self, name: str, path: str) -> None:
+        try: mtime = os.stat(path).st_mtime
+        except OSError: return
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO tools VALUES (?, ?, ?)", (name, path, mtime))
+
+    def close(self) -> None:
+        self.conn.close()
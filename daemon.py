@@ -0,0 +1,146 @@
+# Modalità servizio (--serve): il browser e ffmpeg restano pronti tra una richiesta e l'altra
+# e i lavori arrivano da una piccola API HTTP locale in JSON.
+#
+#   POST   /jobs        {"link": ...} oppure {"title": ...}, con seasons/episodes/priority/pick/type/outdir
+#   GET    /jobs        elenco dei lavori con stato e avanzamento
+#   GET    /jobs/<id>   un singolo lavoro
+#   DELETE /jobs/<id>   annulla un lavoro in coda o in corso
+#   GET    /            riepilogo degli stati e avanzamento aggregato dei download in corso
+#
+# I lavori passano dalla stessa coda SQLite della modalità batch e vengono eseguiti da
+# `run_job`, fornita da main2, che usa le normali funzioni di ricerca, risoluzione e download.
+
+import asyncio
+import json
+import urllib.parse
+from http import HTTPStatus
+
+from jobs import FINISHED_STATES, JobProgress, JobQueue, parse_job_entry
+
+MAX_BODY_BYTES = 64 * 1024
+KEPT_FINISHED_PROGRESS = 100  # lavori terminati di cui resta consultabile l'avanzamento finale
+
+class DownloadDaemon:
+    """Server HTTP e `concurrency` esecutori che prelevano i lavori dalla coda in ordine di priorità."""
+
+    def __init__(self, queue: JobQueue, run_job, concurrency: int = 1, prepare_job=None, transfers=None):
+        self.queue = queue
+        self.run_job = run_job  # async (job, JobProgress) -> None, aggiorna da sé lo stato del lavoro
+        self.concurrency = max(1, concurrency)
+        self.prepare_job = prepare_job  # es. forma canonica delle selezioni, come per --jobs-file
+        self.transfers = transfers  # () -> dict, stato aggregato dei download (ProgressBoard.snapshot)
+        self.progress: dict[int, JobProgress] = {}
+        self.running: dict[int, asyncio.Task] = {}
+        self._cancelled: set[int] = set()
+        self._wakeup = asyncio.Event()
+
+    # --- Esecuzione dei lavori ---
+
+    async def _runner(self) -> None:
+        while True:
+            job = self.queue.next()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self.progress.pop(job['id'], None)  # un lavoro rimesso in coda torna in fondo all'ordine di inserimento
+            progress = self.progress[job['id']] = JobProgress()
+            task = self.running[job['id']] = asyncio.create_task(self.run_job(job, progress))
+            try: await task
+            except asyncio.CancelledError:
+                # Annullato dall'API: il runner prosegue; se invece è il runner a essere fermato, si propaga.
+                if job['id'] not in self._cancelled: raise
+                self.queue.set_state(job['id'], 'cancelled', "annullato")
+            except Exception as e:
+                self.queue.set_state(job['id'], 'failed', str(e) or type(e).__name__)
+            finally:
+                self.running.pop(job['id'], None)
+                self._cancelled.discard(job['id'])
+                self._forget_old_progress()
+
+    def _forget_old_progress(self) -> None:
+        """Tiene solo l'avanzamento dei lavori in corso e degli ultimi KEPT_FINISHED_PROGRESS terminati."""
+        finished = [job_id for job_id in self.progress if job_id not in self.running]
+        for job_id in finished[:max(0, len(finished) - KEPT_FINISHED_PROGRESS)]: del self.progress[job_id]
+
+    def submit(self, payload: dict) -> dict:
+        job = parse_job_entry(payload, "richiesta")
+        if self.prepare_job is not None: job = self.prepare_job(job)
+        job_id = self.queue.add(job, requeue_finished=True)
+        self._wakeup.set()
+        return self.describe(self.queue.get(job_id))
+
+    def cancel(self, job_id: int) -> dict | None:
+        job = self.queue.get(job_id)
+        if job is None: return None
+        if job_id in self.running:
+            self._cancelled.add(job_id)
+            self.running[job_id].cancel()
+        elif job['state'] not in FINISHED_STATES: self.queue.set_state(job_id, 'cancelled', "annullato")
+        return self.describe(self.queue.get(job_id))
+
+    def describe(self, job: dict) -> dict:
+        progress = self.progress.get(job['id'])
+        return {k: job[k] for k in ('id', 'link', 'title', 'seasons', 'episodes', 'priority', 'state', 'attempts', 'error')} | {
+            'progress': progress.to_dict() if progress else None}
+
+    # --- API HTTP ---
+
+    async def _route(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, object]:
+        parts = [p for p in path.split('/') if p]
+        if method == 'GET' and not parts:
+            return HTTPStatus.OK, {'jobs': self.queue.counts(), 'running': sorted(self.running),
+                                   'transfers': self.transfers() if self.transfers else None}
+        if parts[:1] != ['jobs'] or len(parts) > 2:
+            return HTTPStatus.NOT_FOUND, {'error': "percorso sconosciuto"}
+        if len(parts) == 1:
+            if method == 'GET': return HTTPStatus.OK, [self.describe(job) for job in self.queue.recent()]
+            if method == 'POST':
+                try: payload = json.loads(body or b'null')
+                except json.JSONDecodeError as e: return HTTPStatus.BAD_REQUEST, {'error': f"JSON non valido: {e.msg}"}
+                try: return HTTPStatus.CREATED, self.submit(payload)
+                except ValueError as e: return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': "metodo non supportato"}
+
+        try: job_id = int(parts[1])
+        except ValueError: return HTTPStatus.NOT_FOUND, {'error': "id non valido"}
+        if method == 'GET':
+            job = self.queue.get(job_id)
+            return (HTTPStatus.OK, self.describe(job)) if job else (HTTPStatus.NOT_FOUND, {'error': "lavoro inesistente"})
+        if method == 'DELETE':
+            job = self.cancel(job_id)
+            return (HTTPStatus.OK, job) if job else (HTTPStatus.NOT_FOUND, {'error': "lavoro inesistente"})
+        return HTTPStatus.METHOD_NOT_ALLOWED, {'error': "metodo non supportato"}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length') or 0)
+            if len(request_line) < 2: status, payload = HTTPStatus.BAD_REQUEST, {'error': "richiesta non valida"}
+            elif length > MAX_BODY_BYTES: status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "corpo troppo grande"}
+            else:
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self._route(request_line[0].upper(), urllib.parse.urlparse(request_line[1]).path, body)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, payload = HTTPStatus.BAD_REQUEST, {'error': "richiesta non valida"}
+        data = json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode('latin-1') + data)
+        try: await writer.drain()
+        except ConnectionError: pass
+        finally: writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8787) -> None:
+        """Avvia API ed esecutori e resta in esecuzione finché non viene annullato (Ctrl+C)."""
+        self.queue.requeue_interrupted()
+        server = await asyncio.start_server(self._handle, host, port)
+        runners = [asyncio.create_task(self._runner()) for _ in range(self.concurrency)]
+        try:
+            async with server: await server.serve_forever()
+        finally:
+            for task in [*runners, *self.running.values()]: task.cancel()
+            await asyncio.gather(*runners, return_exceptions=True)
@@ -0,0 +1,117 @@
+# Estrazione dei dati dalle pagine HTML sul percorso critico.
+# Usa lxml con selettori mirati (solo gli elementi che servono) invece di costruire
+# l'intero albero BeautifulSoup, e decodifica direttamente gli script offuscati con
+# il packer di Dean Edwards (eval(function(p,a,c,k,e,d)...)) senza passare da jsbeautifier.
+
+import re
+
+import lxml.html
+from lxml import etree
+
+class UnpackError(Exception):
+    """Lo script non è nel formato p,a,c,k,e,d atteso."""
+
+_PACKED_RE = re.compile(r"eval\s*\(\s*function\s*\(\s*p\s*,\s*a\s*,\s*c\s*,\s*k\s*,\s*e\s*,\s*(?:d|r)\s*\)")
+# Argomenti della chiamata finale: }('payload', radix, count, 'k1|k2|...'.split('|')
+_ARGS_RE = re.compile(r"\}\s*\(\s*'((?:[^'\\]|\\.)*)'\s*,\s*(\d+|\[\])\s*,\s*(\d+)\s*,\s*'((?:[^'\\]|\\.)*)'\s*\.split\(\s*'\|'\s*\)", re.DOTALL)
+_WORD_RE = re.compile(r"\b\w+\b", re.ASCII)
+_ALPHABET_62 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_ALPHABET_95 = " !\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~"
+
+_SOURCES_RE = re.compile(r"""sources\s*:\s*\[\s*\{\s*src\s*:\s*["']([^"']+)["']""")
+
+def is_packed(script: str) -> bool:
+    return _PACKED_RE.search(script) is not None
+
+def _unbaser(radix: int):
+    if 2 <= radix <= 36:
+        return lambda word: int(word, radix)
+    alphabet = _ALPHABET_95 if radix == 95 else _ALPHABET_62[:radix]
+    if radix > len(alphabet): raise UnpackError(f"Base {radix} non supportata.")
+    digits = {c: i for i, c in enumerate(alphabet)}
+    def unbase(word: str) -> int:
+        value = 0
+        for c in word: value = value * radix + digits[c]
+        return value
+    return unbase
+
+def unpack(script: str) -> str:
+    """Decodifica uno script p,a,c,k,e,d restituendo il sorgente originale."""
+    packed = _PACKED_RE.search(script)
+    match = _ARGS_RE.search(script, packed.end() if packed else 0)
+    if not match: raise UnpackError("Argomenti del packer non trovati.")
+    payload, radix, count, keywords = match.groups()
+    radix = 62 if radix == '[]' else int(radix)
+    symtab = keywords.split('|')
+    if int(count) != len(symtab): raise UnpackError("Tabella dei simboli non valida.")
+    unbase = _unbaser(radix)
+
+    def lookup(m: re.Match) -> str:
+        word = m.group(0)
+        try: return symtab[unbase(word)] or word
+        except (KeyError, IndexError, ValueError): return word
+
+    payload = payload.replace("\\\\", "\\").replace("\\'", "'")
+    return _WORD_RE.sub(lookup, payload)
+
+def find_m3u8_in_scripts(scripts: list[str]) -> str | None:
+    """Cerca `sources:[{src:"..."}]` negli script offuscati (eval) della pagina del player."""
+    for script in scripts:
+        if 'eval' not in script: continue
+        try:
+            source = unpack(script) if is_packed(script) else script
+        except UnpackError:
+            # Varianti del packer non riconosciute: si ripiega sul decodificatore di jsbeautifier.
+            import jsbeautifier
+            source = jsbeautifier.beautify(script)
+        match = _SOURCES_RE.search(source)
+        if match: return match.group(1)
+    return None
+
+def _parse(html: str):
+    try: return lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError): return None
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+def extract_eval_scripts(html: str) -> list[str]:
+    """Testo degli <script> che contengono `eval`."""
+    doc = _parse(html)
+    if doc is None: return []
+    return [s.text for s in doc.xpath("//script[contains(text(), 'eval')]") if s.text]
+
+def extract_m3u8(html: str) -> str | None:
+    return find_m3u8_in_scripts(extract_eval_scripts(html))
+
+def extract_title(html: str) -> str | None:
+    """Testo del primo <h1>, oppure del <title>, se presenti."""
+    doc = _parse(html)
+    if doc is None: return None
+    for xpath in ("(//h1)[1]", "(//title)[1]"):
+        found = doc.xpath(xpath)
+        if found and found[0].text_content().strip(): return found[0].text_content().strip()
+    return None
+
+def parse_search_results(html: str) -> list[dict]:
+    """Risultati di `?s=`: un dizionario (title, link, type) per ogni div.movie."""
+    doc = _parse(html)
+    if doc is None: return []
+    results = []
+    for item in doc.xpath(f"//div[{_has_class('movie')}]"):
+        title_tag = item.xpath("(.//h2)[1]")
+        link_tag = item.xpath("(.//a)[1]")
+        if title_tag and link_tag and link_tag[0].get('href'):
+            href = link_tag[0].get('href')
+            results.append({
+                'title': title_tag[0].text_content().strip(),
+                'link': href,
+                'type': "Serie TV" if "/serietv/" in href else "Film",
+            })
+    return results
+
+def extract_links(html: str, container_class: str) -> list[tuple[str, str]]:
+    """Coppie (href, testo) dei link dentro `div.<container_class>` (es. div_seasons, div_episodes)."""
+    doc = _parse(html)
+    if doc is None: return []
+    return [(a.get('href'), a.text_content().strip()) for a in doc.xpath(f"//div[{_has_class(container_class)}]//a[@href]")]
@@ -0,0 +1,344 @@
+# Motore HLS nativo: legge la playlist M3U8 e scarica i segmenti in parallelo
+# tramite una sessione curl_cffi condivisa (connessioni keep-alive riutilizzate).
+# I segmenti vengono consegnati in ordine a un "sink" (es. lo stdin di ffmpeg),
+# quindi ffmpeg si occupa solo del remux finale con -c copy.
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import re
+import urllib.parse
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+if TYPE_CHECKING:
+    from curl_cffi.requests import AsyncSession
+    from scheduler import DownloadScheduler
+
+IMPERSONATE = 'chrome110'
+# Un trasferimento viene interrotto solo se resta sotto STALL_MIN_BYTES_PER_S per STALL_SECONDS
+# (o se la connessione non si apre in CONNECT_TIMEOUT): nessun limite sulla durata totale, che
+# su una linea lenta condivisa da più segmenti in parallelo può superare qualunque soglia fissa.
+CONNECT_TIMEOUT = 10
+STALL_SECONDS = 20
+STALL_MIN_BYTES_PER_S = 1024
+
+class HLSError(Exception):
+    """Errore non recuperabile durante l'analisi o il download di un flusso HLS."""
+
+@dataclass
+class Segment:
+    index: int
+    uri: str
+    duration: float
+
+@dataclass
+class Variant:
+    uri: str
+    bandwidth: int = 0
+    resolution: tuple[int, int] | None = None
+    audio_uri: str | None = None  # media playlist dell'audio, se è una rendition separata (#EXT-X-MEDIA TYPE=AUDIO)
+
+    @property
+    def height(self) -> int | None:
+        return self.resolution[1] if self.resolution else None
+
+    def describe(self) -> str:
+        parts = [f"{self.resolution[0]}x{self.resolution[1]}"] if self.resolution else []
+        if self.bandwidth: parts.append(f"{self.bandwidth / 1e6:.1f} Mbit/s")
+        return ", ".join(parts) or "qualità sconosciuta"
+
+@dataclass
+class MediaPlaylist:
+    url: str
+    segments: list[Segment] = field(default_factory=list)
+    init_uri: str | None = None
+    encrypted: bool = False
+    byterange: bool = False  # segmenti come intervalli di byte di un file (#EXT-X-BYTERANGE)
+    variants: list[Variant] = field(default_factory=list)  # vuota se l'URL era già una media playlist
+    variant: Variant | None = None  # variante scelta dalla master playlist
+
+    @property
+    def audio_url(self) -> str | None:
+        """Playlist dell'audio da scaricare insieme ai segmenti video, se l'audio non è nel flusso della variante."""
+        return self.variant.audio_uri if self.variant is not None else None
+
+    @property
+    def total_duration(self) -> float:
+        return sum(s.duration for s in self.segments)
+
+    @property
+    def rendition(self) -> str:
+        """Identifica la variante scelta (banda e risoluzione): gli URI possono cambiare a ogni estrazione perché firmati."""
+        if self.variant is None: return ""
+        resolution = f"{self.variant.resolution[0]}x{self.variant.resolution[1]}" if self.variant.resolution else ""
+        return f"{self.variant.bandwidth}/{resolution}"
+
+@dataclass
+class Checkpoint:
+    """Manifest laterale (JSON) con l'avanzamento di un download, usato per riprenderlo."""
+    path: Path
+    segments_total: int = 0
+    segments_done: int = 0
+    bytes_written: int = 0
+    duration: float = 0.0
+    rendition: str = ""  # MediaPlaylist.rendition della variante scritta nel .part
+    complete: bool = False
+
+    @classmethod
+    def load(cls, path: Path) -> 'Checkpoint | None':
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            return cls(path=path, **{k: data[k] for k in ('segments_total', 'segments_done', 'bytes_written', 'duration', 'rendition', 'complete') if k in data})
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def save(self) -> None:
+        data = asdict(self)
+        data.pop('path')
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(json.dumps(data), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+def checkpoint_path(output_file: Path) -> Path:
+    return output_file.with_name(f".{output_file.name}.resume.json")
+
+def part_path(output_file: Path) -> Path:
+    return output_file.with_name(output_file.name + '.part')
+
+_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+def _parse_attributes(line: str) -> dict[str, str]:
+    """Converte 'A=1,B="x,y"' in {'A': '1', 'B': 'x,y'}."""
+    _, _, attrs = line.partition(':')
+    return {k: v.strip('"') for k, v in _ATTR_RE.findall(attrs)}
+
+def is_master_playlist(text: str) -> bool:
+    return '#EXT-X-STREAM-INF' in text
+
+def _audio_renditions(text: str, base_url: str) -> dict[str, str]:
+    """
+    Per ogni gruppo audio (#EXT-X-MEDIA TYPE=AUDIO) la playlist della rendition da usare: quella
+    DEFAULT, altrimenti AUTOSELECT, altrimenti la prima. I gruppi senza URI (audio già nel flusso
+    della variante) non vengono restituiti.
+    """
+    groups: dict[str, list[dict[str, str]]] = {}
+    for line in (l.strip() for l in text.splitlines()):
+        if line.startswith('#EXT-X-MEDIA:'):
+            attrs = _parse_attributes(line)
+            if attrs.get('TYPE', '').upper() == 'AUDIO' and 'GROUP-ID' in attrs:
+                groups.setdefault(attrs['GROUP-ID'], []).append(attrs)
+    audio = {}
+    for group_id, renditions in groups.items():
+        with_uri = [r for r in renditions if r.get('URI')]
+        if not with_uri: continue
+        chosen = next((r for key in ('DEFAULT', 'AUTOSELECT') for r in with_uri if r.get(key, '').upper() == 'YES'), with_uri[0])
+        audio[group_id] = urllib.parse.urljoin(base_url, chosen['URI'])
+    return audio
+
+def parse_master_playlist(text: str, base_url: str) -> list[Variant]:
+    variants: list[Variant] = []
+    audio = _audio_renditions(text, base_url)
+    pending: dict[str, str] | None = None
+    for line in (l.strip() for l in text.splitlines()):
+        if line.startswith('#EXT-X-STREAM-INF'):
+            pending = _parse_attributes(line)
+        elif line and not line.startswith('#') and pending is not None:
+            resolution = None
+            if 'x' in pending.get('RESOLUTION', ''):
+                w, h = pending['RESOLUTION'].split('x', 1)
+                try: resolution = (int(w), int(h))
+                except ValueError: pass
+            try: bandwidth = int(pending.get('BANDWIDTH', 0))
+            except ValueError: bandwidth = 0
+            variants.append(Variant(urllib.parse.urljoin(base_url, line), bandwidth, resolution, audio.get(pending.get('AUDIO', ''))))
+            pending = None
+    return variants
+
+def parse_media_playlist(text: str, base_url: str) -> MediaPlaylist:
+    playlist = MediaPlaylist(url=base_url)
+    duration = 0.0
+    for line in (l.strip() for l in text.splitlines()):
+        if line.startswith('#EXTINF:'):
+            try: duration = float(line[len('#EXTINF:'):].split(',', 1)[0])
+            except ValueError: duration = 0.0
+        elif line.startswith('#EXT-X-KEY'):
+            if _parse_attributes(line).get('METHOD', 'NONE').upper() != 'NONE':
+                playlist.encrypted = True
+        elif line.startswith('#EXT-X-BYTERANGE'):
+            playlist.byterange = True
+        elif line.startswith('#EXT-X-MAP'):
+            attributes = _parse_attributes(line)
+            if attributes.get('URI'): playlist.init_uri = urllib.parse.urljoin(base_url, attributes['URI'])
+            if 'BYTERANGE' in attributes: playlist.byterange = True
+        elif line and not line.startswith('#'):
+            playlist.segments.append(Segment(len(playlist.segments), urllib.parse.urljoin(base_url, line), duration))
+            duration = 0.0
+    return playlist
+
+def new_session(referer: str, concurrency: int) -> AsyncSession:
+    """
+    Sessione condivisa: stesso Referer usato da ffmpeg e pool di connessioni riutilizzabili.
+    Timeout di connessione e soglia di stallo valgono per tutte le richieste della sessione.
+    """
+    from curl_cffi.const import CurlOpt  # import differito: serve solo quando si scarica
+    from curl_cffi.requests import AsyncSession
+    # Le curl_options della sessione vengono applicate dopo quelle della singola richiesta.
+    stall_options = {
+        CurlOpt.CONNECTTIMEOUT_MS: CONNECT_TIMEOUT * 1000,
+        CurlOpt.LOW_SPEED_LIMIT: STALL_MIN_BYTES_PER_S,
+        CurlOpt.LOW_SPEED_TIME: STALL_SECONDS,
+        CurlOpt.TIMEOUT_MS: 0,
+    }
+    return AsyncSession(impersonate=IMPERSONATE, headers={'Referer': referer}, max_clients=max(1, concurrency), curl_options=stall_options)
+
+async def fetch_bytes(session: AsyncSession, url: str, retries: int = 3, scheduler: DownloadScheduler | None = None, priority=(0, 0)) -> bytes:
+    """
+    GET con tentativi multipli e backoff esponenziale; con uno scheduler passa per i suoi limiti di banda e connessioni.
+    Senza limite di durata totale: con una sessione di `new_session` un tentativo fallisce solo se il trasferimento si blocca.
+    """
+    last_error: Exception | None = None
+    for attempt in range(retries):
+        try:
+            async with (scheduler.slot(url, priority) if scheduler else contextlib.nullcontext({})) as slot:
+                r = await session.get(url, timeout=None)
+                slot['status'], slot['bytes'], slot['retry_after'] = r.status_code, len(r.content), r.headers.get('Retry-After')
+                r.raise_for_status()
+                return r.content
+        except Exception as e:
+            last_error = e
+            if attempt + 1 < retries:
+                await asyncio.sleep(min(0.5 * 2 ** attempt, 8))
+    raise HLSError(f"Impossibile scaricare {url} dopo {retries} tentativi: {last_error}")
+
+async def playlist_is_valid(url: str, referer: str, timeout: float = 8) -> bool:
+    """Controllo economico: una sola GET della playlist, che deve rispondere con un M3U8 valido."""
+    from curl_cffi.requests import AsyncSession
+    try:
+        async with AsyncSession(impersonate=IMPERSONATE, headers={'Referer': referer}) as session:
+            r = await session.get(url, timeout=timeout)
+            return r.status_code == 200 and r.content.lstrip().startswith(b'#EXTM3U')
+    except Exception:
+        return False
+
+def select_variant(variants: list[Variant], max_height: int | None = None, max_bitrate: int | None = None) -> Variant:
+    """
+    Sceglie la variante con bitrate più alto entro i limiti di altezza (pixel) e bitrate (bit/s);
+    le varianti senza risoluzione o BANDWIDTH dichiarati non vengono escluse dal rispettivo limite.
+    Se nessuna rientra nei limiti viene scelta la più leggera.
+    """
+    def _fits(v: Variant) -> bool:
+        if max_height and v.height and v.height > max_height: return False
+        return not (max_bitrate and v.bandwidth and v.bandwidth > max_bitrate)
+    eligible = [v for v in variants if _fits(v)]
+    if not eligible: return min(variants, key=lambda v: (v.bandwidth, v.height or 0))
+    return max(eligible, key=lambda v: (v.bandwidth, v.height or 0))
+
+async def load_media_playlist(session: AsyncSession, url: str, max_height: int | None = None, max_bitrate: int | None = None,
+                              scheduler: DownloadScheduler | None = None, priority: int = 0) -> MediaPlaylist:
+    """
+    Scarica la playlist una sola volta; se è una master sceglie la variante con `select_variant`
+    (senza limiti quella con bitrate più alto, come ffmpeg) e scarica solo la sua media playlist.
+    Il risultato contiene segmenti e durate (somma degli #EXTINF), quindi non serve ffprobe.
+    Se la variante ha l'audio in una rendition separata, il suo URL è in `audio_url`.
+    """
+    text = (await fetch_bytes(session, url, scheduler=scheduler, priority=(priority, -1))).decode('utf-8', errors='replace')
+    variants, variant = [], None
+    if is_master_playlist(text):
+        variants = parse_master_playlist(text, url)
+        if not variants: raise HLSError("Master playlist senza varianti.")
+        variant = select_variant(variants, max_height, max_bitrate)
+        url = variant.uri
+        text = (await fetch_bytes(session, url, scheduler=scheduler, priority=(priority, -1))).decode('utf-8', errors='replace')
+    playlist = parse_media_playlist(text, url)
+    if not playlist.segments: raise HLSError("Playlist senza segmenti.")
+    playlist.variants, playlist.variant = variants, variant
+    return playlist
+
+async def download_segments(
+    session: AsyncSession,
+    playlist: MediaPlaylist,
+    write: Callable[[Segment, bytes], Awaitable[None]],
+    concurrency: int = 8,
+    retries: int = 5,
+    start: int = 0,
+    scheduler: DownloadScheduler | None = None,
+    priority: int = 0,
+) -> None:
+    """
+    Scarica i segmenti con una finestra scorrevole di `concurrency` richieste in volo
+    e li passa a `write` rigorosamente in ordine. Un segmento bloccato (fermo per STALL_SECONDS)
+    viene interrotto e riprovato, mentre i successivi nella finestra continuano a scaricarsi;
+    un segmento solo lento, invece, non viene mai interrotto.
+    Con `start` > 0 si riparte da quel segmento (il segmento di init è già stato scritto).
+    Con uno scheduler ogni segmento ha priorità (`priority`, indice): i download partiti prima
+    e, al loro interno, i segmenti precedenti vengono serviti per primi.
+    """
+    if playlist.init_uri and start == 0:
+        data = await fetch_bytes(session, playlist.init_uri, retries, scheduler, (priority, -1))
+        await write(Segment(-1, playlist.init_uri, 0.0), data)
+
+    segments = playlist.segments
+    window = max(1, concurrency)
+    pending: dict[int, asyncio.Task] = {}
+    scheduled = start
+    try:
+        for i in range(start, len(segments)):
+            seg = segments[i]
+            while scheduled < len(segments) and scheduled < i + window:
+                pending[scheduled] = asyncio.create_task(fetch_bytes(session, segments[scheduled].uri, retries, scheduler, (priority, scheduled)))
+                scheduled += 1
+            await write(seg, await pending.pop(i))
+    finally:
+        for task in pending.values(): task.cancel()
+        if pending: await asyncio.gather(*pending.values(), return_exceptions=True)
+
+async def download_resumable(
+    session: AsyncSession,
+    playlist: MediaPlaylist,
+    part_file: Path,
+    checkpoint: Checkpoint,
+    on_segment: Callable[[Segment, int], None] | None = None,
+    concurrency: int = 8,
+    retries: int = 5,
+    scheduler: DownloadScheduler | None = None,
+    priority: int = 0,
+) -> int:
+    """
+    Scrive il flusso in ordine su `part_file` aggiornando il checkpoint dopo ogni segmento.
+    Se il checkpoint corrisponde alla stessa playlist (variante, numero di segmenti e durata) il file
+    viene troncato all'ultimo offset registrato e si riparte da lì. Finché nessun segmento
+    è completo si riparte da zero, segmento di inizializzazione compreso.
+    Restituisce l'indice del segmento da cui è ripartito il download.
+    """
+    start = 0
+    if (checkpoint.segments_done > 0 and checkpoint.segments_total == len(playlist.segments)
+            and checkpoint.rendition == playlist.rendition
+            and abs(checkpoint.duration - playlist.total_duration) < 1
+            and part_file.exists() and part_file.stat().st_size >= checkpoint.bytes_written):
+        start = checkpoint.segments_done
+    else:
+        checkpoint.segments_total, checkpoint.duration = len(playlist.segments), playlist.total_duration
+        checkpoint.rendition = playlist.rendition
+        checkpoint.segments_done = checkpoint.bytes_written = 0
+    checkpoint.complete = False
+    checkpoint.save()
+
+    with open(part_file, 'r+b' if start else 'wb') as f:
+        f.truncate(checkpoint.bytes_written)
+        f.seek(checkpoint.bytes_written)
+
+        async def _write(seg: Segment, data: bytes) -> None:
+            f.write(data)
+            f.flush()
+            if seg.index >= 0: checkpoint.segments_done = seg.index + 1
+            checkpoint.bytes_written = f.tell()
+            checkpoint.save()
+            if on_segment is not None: on_segment(seg, len(data))
+
+        await download_segments(session, playlist, _write, concurrency, retries, start=start, scheduler=scheduler, priority=priority)
+    return start
@@ -0,0 +1,155 @@
+# Modalità batch e servizio: lettura del file dei lavori (--jobs-file) e coda persistente su SQLite.
+# Ogni lavoro è un link diretto o un titolo da cercare, con la selezione di stagioni ed
+# episodi. La coda conserva lo stato di ogni lavoro tra un'esecuzione e l'altra, scarta i
+# duplicati e restituisce i lavori in ordine di priorità.
+
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from cache import DEFAULT_DB_PATH, open_db
+
+STATES = ("pending", "resolving", "downloading", "done", "failed", "cancelled")
+FINISHED_STATES = ("done", "failed", "cancelled")
+JOB_FIELDS = ("link", "title", "seasons", "episodes", "priority", "pick", "type", "outdir")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    link TEXT,
+    title TEXT,
+    seasons TEXT NOT NULL,
+    episodes TEXT NOT NULL,
+    pick INTEGER,
+    type TEXT,
+    outdir TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, priority DESC, id);
+"""
+
+def _selection_text(value) -> str:
+    """Le selezioni possono arrivare come stringa ("1,3-4"), numero o lista (YAML)."""
+    if value is None: return "all"
+    if isinstance(value, (list, tuple)): return ",".join(str(v) for v in value)
+    return str(value).strip() or "all"
+
+def parse_job_entry(entry, where: str) -> dict:
+    """Valida una voce del file dei lavori (o di una richiesta) e ne restituisce la forma completa."""
+    if isinstance(entry, str): entry = {'link': entry} if entry.startswith(("http://", "https://")) else {'title': entry}
+    if not isinstance(entry, dict): raise ValueError(f"{where}: atteso un oggetto, trovato {type(entry).__name__}.")
+    unknown = set(entry) - set(JOB_FIELDS)
+    if unknown: raise ValueError(f"{where}: campi sconosciuti {', '.join(sorted(unknown))}.")
+    if not entry.get('link') and not entry.get('title'): raise ValueError(f"{where}: serve 'link' oppure 'title'.")
+    job = {name: entry.get(name) for name in JOB_FIELDS}
+    job['seasons'], job['episodes'] = _selection_text(job['seasons']), _selection_text(job['episodes'])
+    job['priority'] = job['priority'] or 0
+    for name in ('priority', 'pick'):
+        if job[name] is None: continue
+        try: job[name] = int(job[name])
+        except (TypeError, ValueError): raise ValueError(f"{where}: '{name}' deve essere un numero intero, trovato {job[name]!r}.")
+    return job
+
+def load_jobs_file(path: Path) -> list[dict]:
+    """
+    Legge un file JSONL (un oggetto per riga, righe vuote e `#` ignorate) o YAML (lista di
+    oggetti, oppure un oggetto con chiave `jobs`). Una voce può anche essere solo un link o un titolo.
+    """
+    text = Path(path).read_text(encoding='utf-8')
+    if Path(path).suffix.lower() in (".yaml", ".yml"):
+        try: import yaml
+        except ImportError: raise ValueError("Per i file YAML serve PyYAML (pip install pyyaml); in alternativa usa il formato JSONL.")
+        data = yaml.safe_load(text) or []
+        if isinstance(data, dict): data = data.get('jobs') or []
+        return [parse_job_entry(entry, f"{path}: voce {i + 1}") for i, entry in enumerate(data)]
+
+    jobs = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'): continue
+        try: entry = json.loads(line)
+        except json.JSONDecodeError as e: raise ValueError(f"{path}:{lineno}: JSON non valido ({e.msg}).")
+        jobs.append(parse_job_entry(entry, f"{path}:{lineno}"))
+    return jobs
+
+@dataclass
+class JobProgress:
+    """Avanzamento di un lavoro in corso: episodi (o film) previsti, completati, falliti e file in download."""
+    episodes_total: int = 0
+    episodes_done: int = 0
+    episodes_failed: int = 0
+    episodes_skipped: int = 0
+    downloading: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+class JobQueue:
+    """
+    Coda dei lavori su SQLite. Un lavoro è identificato dalla chiave (link o titolo cercato,
+    stagioni, episodi): aggiungerlo di nuovo ne alza al più la priorità e rimette in coda
+    quelli falliti, mentre quelli completati restano tali.
+    """
+
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH):
+        self.conn = open_db(db_path)
+        self.conn.row_factory = lambda cursor, row: {col[0]: value for col, value in zip(cursor.description, row)}
+        self.conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def job_key(job: dict) -> str:
+        target = job['link'] or f"cerca:{job['title'].strip().casefold()}|{job.get('type') or ''}|{job.get('pick') or ''}"
+        return f"{target}|{job['seasons']}|{job['episodes']}"
+
+    def add(self, job: dict, requeue_finished: bool = False) -> int:
+        """Aggiunge (o aggiorna) un lavoro e ne restituisce l'id; con `requeue_finished` rimette in coda anche quelli completati."""
+        now = time.time()
+        requeue = FINISHED_STATES if requeue_finished else ("failed", "cancelled")
+        key = self.job_key(job)
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (key, link, title, seasons, episodes, pick, type, outdir, priority, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET priority = max(priority, excluded.priority), outdir = excluded.outdir, "
+                f"state = CASE WHEN state IN ({', '.join('?' * len(requeue))}) THEN 'pending' ELSE state END, updated_at = excluded.updated_at",
+                (key, job['link'], job['title'], job['seasons'], job['episodes'], job['pick'], job['type'], job['outdir'], job['priority'], now, now, *requeue))
+        return self.conn.execute("SELECT id FROM jobs WHERE key = ?", (key,)).fetchone()['id']
+
+    def get(self, job_id: int) -> dict | None:
+        return self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def recent(self, limit: int = 100) -> list[dict]:
+        """Lavori più recenti per primi."""
+        return self.conn.execute("SELECT * FROM jobs ORDER BY updated_at DESC, id DESC LIMIT ?", (limit,)).fetchall()
+
+    def requeue_interrupted(self) -> int:
+        """Rimette in coda i lavori rimasti a metà (es. esecuzione interrotta)."""
+        with self.conn:
+            return self.conn.execute("UPDATE jobs SET state = 'pending' WHERE state IN ('resolving', 'downloading')").rowcount
+
+    def next(self) -> dict | None:
+        """Prende il lavoro in attesa con priorità più alta e lo segna come 'resolving'."""
+        with self.conn:
+            job = self.conn.execute("SELECT * FROM jobs WHERE state = 'pending' ORDER BY priority DESC, id LIMIT 1").fetchone()
+            if job is None: return None
+            self.conn.execute("UPDATE jobs SET state = 'resolving', attempts = attempts + 1, error = NULL, updated_at = ? WHERE id = ?", (time.time(), job['id']))
+        return job
+
+    def set_state(self, job_id: int, state: str, error: str | None = None) -> None:
+        if state not in STATES: raise ValueError(f"Stato non valido: {state}")
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ?", (state, error, time.time(), job_id))
+
+    def counts(self) -> dict[str, int]:
+        rows = self.conn.execute("SELECT state, count(*) AS n FROM jobs GROUP BY state").fetchall()
+        return {state: 0 for state in STATES} | {row['state']: row['n'] for row in rows}
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,37 @@
+# Lettura della libreria già scaricata (--sync): la struttura di output è
+#   <outdir>/Serie/<titolo>/Sxx/<titolo> - SxxEyy.mp4
+# e per ogni serie si ricavano gli episodi presenti su disco, da confrontare con il catalogo
+# del sito per scaricare solo quelli mancanti.
+
+import re
+from pathlib import Path
+
+import hls
+
+_EPISODE_RE = re.compile(r' - S(\d+)E(\d+)\.mp4$')
+
+def scan_series(outdir: Path) -> dict[str, dict[tuple[int, int], Path]]:
+    """Per ogni cartella in `<outdir>/Serie`, i file degli episodi trovati indicizzati per (stagione, episodio)."""
+    library: dict[str, dict[tuple[int, int], Path]] = {}
+    root = outdir / "Serie"
+    if not root.is_dir(): return library
+    for series_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        episodes = library.setdefault(series_dir.name, {})
+        for season_dir in series_dir.glob("S[0-9]*"):
+            for file in season_dir.glob("*.mp4"):
+                found = _EPISODE_RE.search(file.name)
+                if found: episodes[(int(found.group(1)), int(found.group(2)))] = file
+    return library
+
+def download_state(file: Path) -> bool | None:
+    """
+    Stato di un file dal solo manifest accanto a esso, senza avviare ffprobe: True se segnato
+    come completo, False se incompleto o vuoto, None se manca il manifest (file scaricati da
+    versioni precedenti) e serve una verifica.
+    """
+    try:
+        if file.stat().st_size == 0: return False
+    except OSError: return False
+    checkpoint = hls.Checkpoint.load(hls.checkpoint_path(file))
+    if checkpoint is None: return None
+    return checkpoint.complete
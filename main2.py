@@ -5,25 +5,36 @@
 # L'estrazione del link finale avviene analizzando direttamente la pagina del player.
 
 # Importiamo le librerie necessarie.
+# Camoufox, playwright_captcha, curl_cffi e tqdm sono importati solo dove servono,
+# così --help e le esecuzioni servite interamente dalla cache partono subito.
 import asyncio
-from camoufox import AsyncCamoufox
-from playwright_captcha.utils.camoufox_add_init_script.add_init_script import get_addon_path
-from bs4 import BeautifulSoup
+import contextlib
+import itertools
 import re
 import urllib.parse
 import argparse
 import sys
-from curl_cffi import requests
-import jsbeautifier
 import os
 import subprocess
 import shutil
 from pathlib import Path
-from tqdm import tqdm
 import platform
 import zipfile
 import tarfile
 import time
+import hls
+import library
+import extractor
+import metrics
+from progress import ProgressBoard
+from cache import CatalogCache, LinkCache, ToolCache
+from page_pool import PagePool
+from jobs import JobProgress, JobQueue, load_jobs_file
+from daemon import DownloadDaemon
+from scheduler import DownloadScheduler
+from search_index import SearchIndex
+from timing import TimingPolicy
+from request_filter import RequestFilter, DEFAULT_BLOCKED_HOSTS, DEFAULT_BLOCKED_TYPES
 
 # --- CONFIGURAZIONE GLOBALE ---
 
@@ -46,7 +57,23 @@ PROGRESS_BAR_COLOR = "cyan"
 FFMPEG_BIN_PATH: str | None = None
 FFPROBE_BIN_PATH: str | None = None
 DISABLE_PROGRESS = False
-ADDON_PATH = get_addon_path()
+PROGRESS = ProgressBoard(render=not DISABLE_PROGRESS, colour=PROGRESS_BAR_COLOR)  # avanzamento aggregato di tutti i download in corso
+PLAYER_REFERER = "https://flexy.stream/"
+PLAYER_HOSTS = ("uprot.net", "flexy.stream")
+NETWORK_CAPTURE = True  # intercetta la richiesta .m3u8 del player invece di leggere lo script
+LINK_CACHE: LinkCache | None = None
+SEARCH_INDEX: SearchIndex | None = None  # titoli già visti, per cercare senza aprire il browser
+TIMING = TimingPolicy(adaptive=False)  # timeout e tentativi dell'estrazione dei link (adattivi da main())
+DOWNLOAD_ENGINE = "ffmpeg"  # "ffmpeg" (ffmpeg scarica il flusso) oppure "native" (segmenti in parallelo)
+SEGMENT_CONCURRENCY = 8
+SEGMENT_RETRIES = 5
+MAX_HEIGHT: int | None = None  # limite di risoluzione (pixel) nella scelta della variante HLS
+MAX_BITRATE: int | None = None  # limite di bitrate (bit/s) nella scelta della variante HLS
+MAX_RATE: float | None = None  # limite di banda complessivo (byte/s) per tutti i download
+SCHEDULER: DownloadScheduler | None = None  # banda, connessioni per host e priorità condivise tra i download
+RESUME_DOWNLOADS = False  # checkpoint per segmento in un manifest accanto al file di output
+SKIP_EXISTING = True  # salta i file già completi senza aprire il browser
+METRICS = metrics.Metrics()  # span di tempo per fase, attivi con --profile / --metrics-file
 
 # =========================================================================
 # FUNZIONI DI RICERCA E NAVIGAZIONE (con Camoufox/Playwright)
@@ -59,28 +86,33 @@ async def search_content(page, title):
     url = f"{SEARCH_URL}{search_query}"
     
     try:
-        await page.goto(url, wait_until='domcontentloaded')
-        await page.wait_for_selector("div#box_movies", timeout=45000)
+        with METRICS.span('search', title):
+            await page.goto(url, wait_until='domcontentloaded')
+            await page.wait_for_selector("div#box_movies", timeout=45000)
         print(f"{Bcolors.OKGREEN}Pagina dei risultati caricata.{Bcolors.ENDC}")
     except Exception as e:
         print(f"{Bcolors.FAIL}Errore nella ricerca: {e}{Bcolors.ENDC}")
         return []
 
-    soup = BeautifulSoup(await page.content(), 'html.parser')
-    movie_items = soup.find_all('div', class_='movie')
-    
-    results = []
-    for item in movie_items:
-        title_tag = item.find('h2')
-        link_tag = item.find('a')
-        if title_tag and link_tag:
-            content_type = "Serie TV" if "/serietv/" in link_tag['href'] else "Film"
-            results.append({
-                'title': title_tag.text.strip(),
-                'link': link_tag['href'],
-                'type': content_type
-            })
-    return results
+    return extractor.parse_search_results(await page.content())
+
+async def find_content(pool: PagePool, title: str, min_score: float | None = 0.0, use_index: bool = True) -> tuple[list[dict], bool]:
+    """
+    Risultati per `title` dall'indice locale (ricerca già fatta, oppure titoli con punteggio
+    almeno `min_score`; con None solo ricerche già fatte); solo se l'indice non risponde si apre la ricerca sul sito, i cui
+    risultati vengono aggiunti all'indice. Restituisce (risultati, presi dall'indice).
+    """
+    if SEARCH_INDEX is not None and use_index:
+        with METRICS.span('index_lookup', title) as span:
+            results = SEARCH_INDEX.recorded(title) or (SEARCH_INDEX.match(title, min_score) if min_score is not None else [])
+            span['hit'] = bool(results)
+        if results:
+            print(f"{Bcolors.OKGREEN}{len(results)} risultati per '{title}' dall'indice locale.{Bcolors.ENDC}")
+            return results, True
+    async with pool.acquire() as page:
+        results = await search_content(page, title)
+    if SEARCH_INDEX is not None and results: SEARCH_INDEX.add_search(title, results)
+    return results, False
 
 # =========================================================================
 # FUNZIONI HELPER (DOWNLOAD, FFMPEG, PARSING) - INVARIATE
@@ -111,6 +143,8 @@ def parse_selection_arg(arg_value: str):
 
 def _download_file(url: str, dest_path: Path) -> None:
     # Questa funzione rimane sincrona
+    from curl_cffi import requests
+    from tqdm import tqdm
     r = requests.get(url, stream=True, impersonate='chrome110')
     r.raise_for_status()
     try:
@@ -147,6 +181,23 @@ def ensure_ffmpeg() -> bool:
     global FFMPEG_BIN_PATH, FFPROBE_BIN_PATH
     if FFMPEG_BIN_PATH and FFPROBE_BIN_PATH: return True
 
+    # Percorsi già trovati in un'esecuzione precedente, se i file non sono cambiati.
+    tools = ToolCache()
+    try:
+        cached_ffmpeg, cached_ffprobe = tools.get('ffmpeg'), tools.get('ffprobe')
+        if cached_ffmpeg and cached_ffprobe:
+            FFMPEG_BIN_PATH, FFPROBE_BIN_PATH = cached_ffmpeg, cached_ffprobe
+            return True
+        if _discover_ffmpeg():
+            tools.put('ffmpeg', FFMPEG_BIN_PATH)
+            tools.put('ffprobe', FFPROBE_BIN_PATH)
+            return True
+        return False
+    finally:
+        tools.close()
+
+def _discover_ffmpeg() -> bool:
+    global FFMPEG_BIN_PATH, FFPROBE_BIN_PATH
     sys_ffmpeg = shutil.which('ffmpeg')
     sys_ffprobe = shutil.which('ffprobe')
     if sys_ffmpeg and sys_ffprobe:
@@ -207,42 +258,252 @@ def ensure_ffmpeg() -> bool:
         if archive_path and archive_path.exists(): archive_path.unlink()
         return False
 
-def _probe_duration_seconds(m3u8_url: str, referer: str) -> float | None:
+def browser_addon_path() -> str:
+    """Cartella dell'addon di playwright_captcha; il percorso viene salvato per non importare il pacchetto a ogni avvio."""
+    tools = ToolCache()
+    try:
+        path = tools.get('captcha_addon')
+        if path is None:
+            from playwright_captcha.utils.camoufox_add_init_script.add_init_script import get_addon_path
+            path = os.path.abspath(get_addon_path())
+            tools.put('captcha_addon', path)
+        return path
+    finally:
+        tools.close()
+
+async def _probe_duration_seconds(path: str) -> float | None:
+    """Durata in secondi di un file locale (per i flussi remoti la durata arriva dalla playlist)."""
     if not FFPROBE_BIN_PATH: return None
+    with METRICS.span('probe', Path(path).name) as span:
+        span['ok'] = False
+        try:
+            cmd = [FFPROBE_BIN_PATH, "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", path]
+            proc = await asyncio.create_subprocess_exec(*cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            try:
+                out, _ = await asyncio.wait_for(proc.communicate(), timeout=20)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                return None
+            out = out.decode(errors='replace').strip()
+            span['ok'] = bool(out and out != "N/A")
+            return float(out) if span['ok'] else None
+        except Exception: return None
+
+async def _analyze_playlist(session, m3u8_url: str, name: str, priority: int = 0) -> hls.MediaPlaylist | None:
+    """
+    Scarica una sola volta master e media playlist: durata totale dalla somma degli #EXTINF e
+    variante scelta secondo MAX_HEIGHT / MAX_BITRATE. Restituisce None se la playlist non è leggibile.
+    """
+    with METRICS.span('playlist', m3u8_url) as span:
+        try: playlist = await hls.load_media_playlist(session, m3u8_url, MAX_HEIGHT, MAX_BITRATE, SCHEDULER, priority)
+        except hls.HLSError as e:
+            span['ok'] = False
+            print(f"{Bcolors.FAIL}Playlist non leggibile per {name}: {e}{Bcolors.ENDC}")
+            return None
+        span['variants'] = len(playlist.variants)
+        if playlist.variant is not None:
+            span['bandwidth'], span['height'] = playlist.variant.bandwidth, playlist.variant.height
+            if len(playlist.variants) > 1:
+                print(f"{Bcolors.OKCYAN}Variante per {name}: {playlist.variant.describe()} (su {len(playlist.variants)} disponibili){Bcolors.ENDC}")
+        return playlist
+
+def _durations_match(local: float, expected: float) -> bool:
+    return abs(local - expected) <= max(2.0, expected * 0.01)
+
+async def is_download_complete(output_file: Path) -> bool:
+    """
+    Un file esistente è considerato completo solo se il manifest lo segna come tale e la durata
+    letta da ffprobe coincide con quella attesa del flusso. I file senza manifest (scaricati da
+    versioni precedenti) vengono verificati da `_download_m3u8_to_mp4` contro la playlist.
+    """
+    if not output_file.exists(): return False
+    checkpoint = hls.Checkpoint.load(hls.checkpoint_path(output_file))
+    if checkpoint is None or not checkpoint.complete: return False
+    local_duration = await _probe_duration_seconds(str(output_file))
+    if not local_duration: return False
+    return not checkpoint.duration or _durations_match(local_duration, checkpoint.duration)
+
+def _mark_download_started(output_file: Path, duration: float | None) -> None:
+    """Segna il file come incompleto prima che un motore inizi a scriverlo, così un download interrotto non passa per completo."""
+    checkpoint = hls.Checkpoint.load(hls.checkpoint_path(output_file)) or hls.Checkpoint(hls.checkpoint_path(output_file))
+    checkpoint.complete = False
+    if duration and not checkpoint.segments_total: checkpoint.duration = duration  # lo stato di ripresa viene verificato da hls
+    checkpoint.save()
+
+def _mark_download_complete(output_file: Path, duration: float | None) -> None:
+    checkpoint = hls.Checkpoint.load(hls.checkpoint_path(output_file)) or hls.Checkpoint(hls.checkpoint_path(output_file))
+    checkpoint.complete = True
+    if duration: checkpoint.duration = duration
+    try: checkpoint.save()
+    except OSError: pass
+
+async def _is_legacy_download_complete(output_file: Path, playlist: hls.MediaPlaylist) -> bool:
+    """File senza manifest né `.part`: è completo se la durata letta da ffprobe coincide con quella della playlist."""
+    if not output_file.exists() or hls.checkpoint_path(output_file).exists() or hls.part_path(output_file).exists(): return False
+    local_duration = await _probe_duration_seconds(str(output_file))
+    return bool(local_duration) and _durations_match(local_duration, playlist.total_duration)
+
+async def _download_m3u8_native(session, playlist: hls.MediaPlaylist, output_file: Path, priority: int = 0) -> bool:
+    """
+    Motore nativo: i segmenti vengono scaricati in parallelo da `hls` e scritti in ordine
+    nello stdin di ffmpeg, che esegue solo il remux (-c copy).
+    Con RESUME_DOWNLOADS il flusso viene invece scritto su un file `.part` con checkpoint
+    dopo ogni segmento, e il remux avviene alla fine leggendo quel file.
+    """
+    print(f"{Bcolors.OKBLUE}Scarico in MP4 (nativo, {len(playlist.segments)} segmenti): {output_file.name}{Bcolors.ENDC}")
+    transfer = PROGRESS.start(output_file.stem, "native", playlist.total_duration)
+    segment_ends = list(itertools.accumulate(seg.duration for seg in playlist.segments))
+    started, fetched = time.monotonic(), 0.0
+
+    def _advance(seg: hls.Segment, nbytes: int) -> None:
+        # La posizione viene dall'indice del segmento, così resta corretta anche quando si riprende un download;
+        # la velocità conta solo i segmenti scaricati in questa esecuzione.
+        nonlocal fetched
+        if seg.index >= 0: transfer.position = segment_ends[seg.index]
+        fetched += seg.duration
+        transfer.bytes += nbytes
+        transfer.speed = fetched / max(time.monotonic() - started, 1e-3)
+
+    remux = [FFMPEG_BIN_PATH, "-y", "-hide_banner", "-nostats", "-loglevel", "error", "-i"]
+    remux_out = ["-c", "copy", "-bsf:a", "aac_adtstoasc", str(output_file)]
+    proc = None
     try:
-        cmd = [FFPROBE_BIN_PATH, "-v", "error", "-headers", f"Referer: {referer}\r\n", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", m3u8_url]
-        out = subprocess.check_output(cmd, stderr=subprocess.STDOUT, text=True, timeout=20).strip()
-        return float(out) if out and out != "N/A" else None
-    except Exception: return None
+        if RESUME_DOWNLOADS:
+            part_file = hls.part_path(output_file)
+            checkpoint_file = hls.checkpoint_path(output_file)
+            checkpoint = hls.Checkpoint.load(checkpoint_file) or hls.Checkpoint(checkpoint_file)
+            start = await hls.download_resumable(session, playlist, part_file, checkpoint, _advance, SEGMENT_CONCURRENCY, SEGMENT_RETRIES, SCHEDULER, priority)
+            if start:
+                print(f"{Bcolors.OKCYAN}Ripreso {output_file.name} dal segmento {start + 1}/{len(playlist.segments)}.{Bcolors.ENDC}")
+            cmd = remux + [str(part_file)] + remux_out
+            proc = await asyncio.create_subprocess_exec(*cmd)
+            if await proc.wait() != 0: raise subprocess.CalledProcessError(proc.returncode, cmd)
+            part_file.unlink(missing_ok=True)
+        else:
+            cmd = remux + ["pipe:0"] + remux_out
+            proc = await asyncio.create_subprocess_exec(*cmd, stdin=subprocess.PIPE)
 
-def download_m3u8_to_mp4(m3u8_url: str, output_file: Path, referer: str = "https://flexy.stream/"):
+            async def _write(seg: hls.Segment, data: bytes) -> None:
+                proc.stdin.write(data)
+                await proc.stdin.drain()
+                _advance(seg, len(data))
+
+            await hls.download_segments(session, playlist, _write, SEGMENT_CONCURRENCY, SEGMENT_RETRIES, scheduler=SCHEDULER, priority=priority)
+            proc.stdin.close()
+            if await proc.wait() != 0: raise subprocess.CalledProcessError(proc.returncode, cmd)
+        _mark_download_complete(output_file, playlist.total_duration)
+        PROGRESS.finish(transfer, True)
+        print(f"{Bcolors.OKGREEN}Download completato: {output_file}{Bcolors.ENDC}")
+        return True
+    except Exception as e:
+        PROGRESS.finish(transfer, False)
+        print(f"{Bcolors.FAIL}Errore download nativo per {output_file.name}: {e}{Bcolors.ENDC}")
+        return False
+    finally:
+        if transfer.ok is None: PROGRESS.finish(transfer, False)  # annullato
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+async def download_m3u8_to_mp4(m3u8_url: str, output_file: Path, referer: str | None = None) -> bool:
+    """
+    Scarica il flusso con ffmpeg come sottoprocesso asincrono, così l'event loop
+    (e quindi il browser) resta libero durante il trasferimento.
+    L'avanzamento viene registrato in PROGRESS, che mostra insieme tutti i download in corso.
+    """
+    with METRICS.span('download', output_file.name, engine=None) as span:
+        span['ok'] = await _download_m3u8_to_mp4(m3u8_url, output_file, referer, span)
+        if span['ok'] and output_file.exists(): span['bytes'] = output_file.stat().st_size
+        return span['ok']
+
+async def _download_m3u8_to_mp4(m3u8_url: str, output_file: Path, referer: str | None, stats: dict) -> bool:
+    """In `stats` viene annotato il motore effettivamente usato (per le metriche)."""
     if not FFMPEG_BIN_PATH:
         print(f"{Bcolors.FAIL}ffmpeg non disponibile. Salto download.{Bcolors.ENDC}")
-        return
+        return False
+    referer = referer or PLAYER_REFERER
 
-    total_duration = _probe_duration_seconds(m3u8_url, referer)
-    cmd = [FFMPEG_BIN_PATH, "-y", "-hide_banner", "-nostats", "-headers", f"Referer: {referer}\r\n", "-i", m3u8_url, "-c", "copy", "-bsf:a", "aac_adtstoasc", "-progress", "pipe:1", "-loglevel", "error", str(output_file)]
+    # La ripresa e il limite di banda lavorano a livello di segmento, quindi richiedono il motore nativo.
+    native = DOWNLOAD_ENGINE == "native" or RESUME_DOWNLOADS or bool(MAX_RATE)
+    priority = SCHEDULER.ticket() if SCHEDULER is not None else 0
+    async with hls.new_session(referer, SEGMENT_CONCURRENCY) as session:
+        playlist = await _analyze_playlist(session, m3u8_url, output_file.name, priority)
+        if SKIP_EXISTING and playlist is not None and await _is_legacy_download_complete(output_file, playlist):
+            _mark_download_complete(output_file, playlist.total_duration)
+            print(f"{Bcolors.OKGREEN}{output_file.name} già scaricato, salto.{Bcolors.ENDC}")
+            return True
+        try: _mark_download_started(output_file, playlist.total_duration if playlist is not None else None)
+        except OSError as e:
+            print(f"{Bcolors.FAIL}Impossibile scrivere il manifest di {output_file.name}: {e}{Bcolors.ENDC}")
+            return False
+        # Il motore nativo scarica un solo flusso di segmenti interi: audio in una rendition separata,
+        # flussi cifrati e segmenti a intervalli di byte passano a ffmpeg.
+        if native and playlist is not None and not playlist.encrypted and not playlist.byterange and not playlist.audio_url:
+            stats['engine'] = "native"
+            return await _download_m3u8_native(session, playlist, output_file, priority)
+    if native:
+        if playlist is None: return False
+        reason = ("Flusso cifrato" if playlist.encrypted else
+                  "Segmenti a intervalli di byte (#EXT-X-BYTERANGE)" if playlist.byterange else "Audio in una traccia separata")
+        print(f"{Bcolors.WARNING}{reason}: uso ffmpeg per {output_file.name}.{Bcolors.ENDC}")
+        dropped = [option for option, active in (("limite di banda (--max-rate)", MAX_RATE), ("ripresa (--resume)", RESUME_DOWNLOADS)) if active]
+        if dropped: print(f"{Bcolors.WARNING}Attenzione: con ffmpeg non sono attivi per {output_file.name}: {', '.join(dropped)}.{Bcolors.ENDC}")
+
+    # ffmpeg riceve direttamente la media playlist della variante scelta, senza rileggere la master;
+    # se l'audio della variante è una rendition separata, la sua playlist diventa un secondo input.
+    stream_url = playlist.url if playlist is not None else m3u8_url
+    audio_url = playlist.audio_url if playlist is not None else None
+    total_duration = playlist.total_duration if playlist is not None else None
+    headers = ["-headers", f"Referer: {referer}\r\n"]
+    inputs = headers + ["-i", stream_url] + (headers + ["-i", audio_url, "-map", "0:v", "-map", "1:a"] if audio_url else [])
+    cmd = [FFMPEG_BIN_PATH, "-y", "-hide_banner", "-nostats", *inputs, "-c", "copy", "-bsf:a", "aac_adtstoasc", "-progress", "pipe:1", "-loglevel", "error", str(output_file)]
     
+    stats['engine'] = "ffmpeg"
     print(f"{Bcolors.OKBLUE}Scarico in MP4: {output_file.name}{Bcolors.ENDC}")
+    transfer = PROGRESS.start(output_file.stem, "ffmpeg", total_duration)
     try:
-        # La logica di download con la progress bar rimane sincrona
-        if total_duration and not DISABLE_PROGRESS:
-            pbar_args = {"total": int(total_duration), "unit": "s", "dynamic_ncols": True, "bar_format": "{l_bar}{bar}| {n_fmt}/{total_fmt}s ETA {remaining}"}
-            try: pbar = tqdm(colour=PROGRESS_BAR_COLOR, **pbar_args)
-            except TypeError: pbar = tqdm(**pbar_args)
-            
-            with pbar, subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True) as proc:
-                for line in proc.stdout:
-                    if line.startswith("out_time_ms="):
-                        ms = int(line.strip().split("=")[1])
-                        pbar.n = min(ms // 1_000_000, pbar.total)
-                        pbar.refresh()
-                if proc.wait() != 0: raise subprocess.CalledProcessError(proc.returncode, cmd)
-        else:
-            subprocess.run(cmd, check=True)
+        # ffmpeg occupa una connessione verso la CDN per tutto il download (limite per host e priorità).
+        async with SCHEDULER.hold(stream_url, (priority, -1)) if SCHEDULER is not None else contextlib.nullcontext():
+            # Le righe chiave=valore di -progress aggiornano solo lo stato: il disegno lo fa PROGRESS a intervalli fissi.
+            proc = await asyncio.create_subprocess_exec(*cmd, stdout=subprocess.PIPE)
+            try:
+                async for raw in proc.stdout:
+                    key, _, value = raw.decode(errors='replace').strip().partition("=")
+                    transfer.apply_ffmpeg_progress(key, value)
+                if await proc.wait() != 0: raise subprocess.CalledProcessError(proc.returncode, cmd)
+            finally:
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+        _mark_download_complete(output_file, total_duration)
+        PROGRESS.finish(transfer, True)
         print(f"{Bcolors.OKGREEN}Download completato: {output_file}{Bcolors.ENDC}")
+        return True
     except Exception as e:
+        PROGRESS.finish(transfer, False)
         print(f"{Bcolors.FAIL}Errore ffmpeg per {output_file.name}: {e}{Bcolors.ENDC}")
+        return False
+    finally:
+        if transfer.ok is None: PROGRESS.finish(transfer, False)  # annullato
+
+async def _download_worker(queue: asyncio.Queue, progress: JobProgress | None = None) -> int:
+    """Consumer della pipeline: scarica gli elementi (m3u8, file di output) finché non riceve None. Restituisce i download falliti."""
+    failed = 0
+    while True:
+        item = await queue.get()
+        try:
+            if item is None: return failed
+            m3u8_url, output_file = item
+            if progress is not None: progress.downloading.append(output_file.name)
+            ok = await download_m3u8_to_mp4(m3u8_url, output_file)
+            if not ok: failed += 1
+            if progress is not None:
+                progress.downloading.remove(output_file.name)
+                if ok: progress.episodes_done += 1
+                else: progress.episodes_failed += 1
+        finally:
+            queue.task_done()
 
 # =========================================================================
 # GESTIONE CONTENUTI (con Camoufox/Playwright)
@@ -250,47 +511,91 @@ def download_m3u8_to_mp4(m3u8_url: str, output_file: Path, referer: str = "https
 
 async def get_page_title(page) -> str:
     """Estrae il titolo principale (h1) dalla pagina, altrimenti usa il titolo del tag <title>."""
-    html = await page.content()
-    soup = BeautifulSoup(html, 'html.parser')
-    h1 = soup.find('h1')
-    return (h1.text.strip() if h1 else await page.title()) or "Contenuto"
+    return extractor.extract_title(await page.content()) or await page.title() or "Contenuto"
+
+def _episode_label(page_url: str, s_num: int, e_num: int) -> str:
+    return f"S{s_num:02d}E{e_num:02d}" if s_num or e_num else page_url
+
+def _is_player_m3u8_request(request) -> bool:
+    """Vero per le richieste .m3u8 partite dall'iframe del player (o da un suo sotto-frame)."""
+    if '.m3u8' not in urllib.parse.urlparse(request.url).path: return False
+    try: frame = request.frame
+    except Exception: return True  # richieste dei worker: non hanno un frame associato
+    while frame is not None:
+        if any(host in (urllib.parse.urlparse(frame.url).hostname or '') for host in PLAYER_HOSTS): return True
+        frame = frame.parent_frame
+    return False
 
 async def get_m3u8_link(page, page_url: str, s_num: int = 0, e_num: int = 0):
+    """
+    Estrae il link M3U8 di una pagina. Con NETWORK_CAPTURE ascolta le richieste della pagina
+    e dei suoi frame e restituisce il primo .m3u8 richiesto dal player appena compare;
+    la lettura dello script offuscato dell'iframe resta come ripiego.
+    """
+    with METRICS.span('extract', _episode_label(page_url, s_num, e_num)) as span:
+        if not NETWORK_CAPTURE:
+            return await _extract_m3u8_link(page, page_url, s_num, e_num, None, span)
+
+        captured = asyncio.get_running_loop().create_future()
+        def _on_request(request):
+            if not captured.done() and _is_player_m3u8_request(request): captured.set_result(request.url)
+
+        page.on("request", _on_request)
+        try:
+            return await _extract_m3u8_link(page, page_url, s_num, e_num, captured, span)
+        finally:
+            page.remove_listener("request", _on_request)
+
+async def _extract_m3u8_link(page, page_url: str, s_num: int, e_num: int, captured: asyncio.Future | None, stats: dict):
     """
     Versione finale con attese stabilizzate per la lettura del player
     e logging migliorato per evitare confusione.
+    Le attese vengono da TIMING (apprese dalle latenze osservate); i nuovi tentativi attendono
+    con backoff e jitter e solo finché resta budget per l'esecuzione.
+    In `stats` vengono annotati i tentativi e l'origine del link (rete o script) per le metriche.
     """
     max_retries = 3
+    label = _episode_label(page_url, s_num, e_num)
+    TIMING.start_extraction()
     for attempt in range(max_retries):
+        stats['attempts'] = attempt + 1
         try:
-            if attempt == 0:
-                print(f"{Bcolors.OKCYAN}Apertura pagina: {page_url}{Bcolors.ENDC}")
-                await page.goto(page_url, wait_until='domcontentloaded', timeout=4500)
-            else:
-                print(f"{Bcolors.OKCYAN}Tentativo {attempt + 1}/{max_retries}... Ricarico la pagina.{Bcolors.ENDC}")
-                await page.reload(wait_until='domcontentloaded')
-                await page.wait_for_timeout(200)
+            with METRICS.span('goto', label, attempt=attempt + 1):
+                if attempt == 0:
+                    print(f"{Bcolors.OKCYAN}Apertura pagina: {page_url}{Bcolors.ENDC}")
+                    with TIMING.measure('goto'): await page.goto(page_url, wait_until='domcontentloaded', timeout=TIMING.timeout_ms('goto'))
+                else:
+                    await asyncio.sleep(TIMING.retry_delay(attempt))
+                    print(f"{Bcolors.OKCYAN}Tentativo {attempt + 1}/{max_retries}... Ricarico la pagina.{Bcolors.ENDC}")
+                    with TIMING.measure('goto'): await page.reload(wait_until='domcontentloaded', timeout=TIMING.timeout_ms('goto'))
+
+            if captured is not None and captured.done():
+                print(f"{Bcolors.OKGREEN}Link M3U8 intercettato dalla rete al tentativo {attempt + 1}.{Bcolors.ENDC}")
+                stats['source'] = 'network'
+                return captured.result()
 
             # --- LOGICA DI SELEZIONE PLAYER STABILIZZATA ---
             try:
-                player_selector = page.locator("select[name='sel_player']")
-                # 1. Attende che il selettore sia visibile e stabile.
-                await player_selector.wait_for(state='visible', timeout=500)
-                # 2. Aggiunge una brevissima pausa per eliminare le race condition.
-                await page.wait_for_timeout(500)
+                with METRICS.span('player_select', label, attempt=attempt + 1):
+                    player_selector = page.locator("select[name='sel_player']")
+                    # 1. Attende che il selettore sia visibile e stabile.
+                    with TIMING.measure('player_select'): await player_selector.wait_for(state='visible', timeout=TIMING.timeout_ms('player_select'))
+                    # 2. Aggiunge una brevissima pausa per eliminare le race condition.
+                    await page.wait_for_timeout(500)
                 
-                current_player_value = await player_selector.input_value()
+                    current_player_value = await player_selector.input_value()
 
-                # 3. Migliora il logging per chiarezza
-                player_display_name = current_player_value if current_player_value else "Default (valore vuoto)"
+                    # 3. Migliora il logging per chiarezza
+                    player_display_name = current_player_value if current_player_value else "Default (valore vuoto)"
 
-                if current_player_value != 'fx':
-                    print(f"{Bcolors.OKBLUE}Player attuale: '{player_display_name}'. Forzo la selezione di 'Flexy (fx)'...{Bcolors.ENDC}")
-                    async with page.expect_navigation(wait_until='domcontentloaded', timeout=2000):
-                        await player_selector.select_option("fx")
-                    print(f"{Bcolors.OKGREEN}Pagina ricaricata con il player 'Flexy' selezionato.{Bcolors.ENDC}")
-                else:
-                    print(f"{Bcolors.OKGREEN}Player 'Flexy (fx)' è già selezionato. Si procede.{Bcolors.ENDC}")
+                    if current_player_value != 'fx':
+                        print(f"{Bcolors.OKBLUE}Player attuale: '{player_display_name}'. Forzo la selezione di 'Flexy (fx)'...{Bcolors.ENDC}")
+                        with TIMING.measure('player_nav'):
+                            async with page.expect_navigation(wait_until='domcontentloaded', timeout=TIMING.timeout_ms('player_nav')):
+                                await player_selector.select_option("fx")
+                        print(f"{Bcolors.OKGREEN}Pagina ricaricata con il player 'Flexy' selezionato.{Bcolors.ENDC}")
+                    else:
+                        print(f"{Bcolors.OKGREEN}Player 'Flexy (fx)' è già selezionato. Si procede.{Bcolors.ENDC}")
 
             except Exception:
                 print(f"{Bcolors.WARNING}Selettore del player non trovato, si procede con il player di default.{Bcolors.ENDC}")
@@ -301,39 +606,55 @@ async def get_m3u8_link(page, page_url: str, s_num: int = 0, e_num: int = 0):
                 raise Exception("CAPTCHA (player MaxStream) rilevato. Nuovo tentativo in corso.")
 
             try:
-                await page.locator("img[src*='player.png']").click(timeout=1000)
+                with TIMING.measure('player_image'): await page.locator("img[src*='player.png']").click(timeout=TIMING.timeout_ms('player_image'))
             except Exception:
                 print(f"{Bcolors.WARNING}Immagine player esterna non trovata o non necessaria.{Bcolors.ENDC}")
 
             iframe_selector = "iframe[src*='uprot.net/fxe'], iframe[src*='flexy.stream']"
             
-            await page.wait_for_selector(iframe_selector, state='visible', timeout=3000)
+            with METRICS.span('iframe_wait', label, attempt=attempt + 1):
+                with TIMING.measure('iframe'): await page.wait_for_selector(iframe_selector, state='visible', timeout=TIMING.timeout_ms('iframe'))
             frame_locator = page.frame_locator(iframe_selector)
             
             try:
                 print(f"{Bcolors.OKBLUE}Trovato iframe. Tento di cliccare sull'area del player video...{Bcolors.ENDC}")
-                await frame_locator.locator('.video-js').click(timeout=1000)
-                print(f"{Bcolors.OKGREEN}Area del player cliccata.{Bcolors.ENDC}")
-                await page.wait_for_timeout(2000)
+                with METRICS.span('player_click', label, attempt=attempt + 1):
+                    with TIMING.measure('player_click'): await frame_locator.locator('.video-js').click(timeout=TIMING.timeout_ms('player_click'))
+                    print(f"{Bcolors.OKGREEN}Area del player cliccata.{Bcolors.ENDC}")
+                    if captured is None:
+                        # Senza intercettazione la pausa dura quanto la richiesta .m3u8 osservata nelle estrazioni precedenti.
+                        await page.wait_for_timeout(TIMING.timeout_ms('m3u8_wait'))
+                    else:
+                        # Invece di una pausa fissa si attende la richiesta .m3u8 del player.
+                        try:
+                            with TIMING.measure('m3u8_wait'): await asyncio.wait_for(asyncio.shield(captured), timeout=TIMING.timeout('m3u8_wait'))
+                        except asyncio.TimeoutError: pass
             except Exception:
                 print(f"{Bcolors.WARNING}Area del player video non trovata o click non necessario.{Bcolors.ENDC}")
 
+            if captured is not None and captured.done():
+                print(f"{Bcolors.OKGREEN}Link M3U8 intercettato dalla rete al tentativo {attempt + 1}.{Bcolors.ENDC}")
+                stats['source'] = 'network'
+                return captured.result()
+
             iframe_source = await frame_locator.locator(':root').inner_html()
 
-            soup = BeautifulSoup(iframe_source, 'html.parser')
-            for script in soup.find_all("script", string=re.compile("eval")):
-                data_js = jsbeautifier.beautify(script.string)
-                match = re.search(r'sources:\s*\[\{\s*src:\s*"([^"]+)"', data_js)
-                if match:
-                    print(f"{Bcolors.OKGREEN}Link M3U8 trovato al tentativo {attempt + 1}.{Bcolors.ENDC}")
-                    return match.group(1)
+            m3u8 = extractor.extract_m3u8(iframe_source)
+            if m3u8:
+                print(f"{Bcolors.OKGREEN}Link M3U8 trovato al tentativo {attempt + 1}.{Bcolors.ENDC}")
+                stats['source'] = 'script'
+                return m3u8
             
             raise Exception("Iframe trovato, ma lo script con il link M3U8 non è presente.")
 
         except Exception as e:
             print(f"{Bcolors.WARNING}Tentativo {attempt + 1} fallito: {str(e).splitlines()[0]}{Bcolors.ENDC}")
-            if attempt + 1 == max_retries:
-                print(f"{Bcolors.FAIL}Tutti i {max_retries} tentativi sono falliti.{Bcolors.ENDC}")
+            last = attempt + 1 == max_retries
+            if not last and not TIMING.allow_retry():
+                print(f"{Bcolors.WARNING}Budget dei nuovi tentativi esaurito per questa esecuzione: non ritento.{Bcolors.ENDC}")
+                last = True
+            if last:
+                print(f"{Bcolors.FAIL}Tutti i {attempt + 1} tentativi sono falliti.{Bcolors.ENDC}")
                 
                 debug_dir = Path.cwd() / "debug_screenshots"
                 ensure_dir(debug_dir)
@@ -343,166 +664,534 @@ async def get_m3u8_link(page, page_url: str, s_num: int = 0, e_num: int = 0):
                 await page.screenshot(path=screenshot_path, full_page=True)
                 print(f"{Bcolors.WARNING}Screenshot dell'ultimo tentativo salvato in: {screenshot_path}{Bcolors.ENDC}")
                 
+                stats['ok'] = False
                 return None
 
+    stats['ok'] = False
     return None
 
-async def enumerate_and_download_series(page, series_url: str, seasons_arg, episodes_arg, outdir: Path, delay: float):
-    print(f"{Bcolors.OKGREEN}Apro la pagina della serie: {series_url}{Bcolors.ENDC}")
-    # Aumentiamo il timeout del goto per dare tempo a eventuali reindirizzamenti anti-bot di risolversi
-    await page.goto(series_url, wait_until='domcontentloaded', timeout=60000)
+def _parse_href(h: str):
+    return tuple(map(int, re.findall(r'\d+', h)[-3:])) if 'streaming-serie-tv' in h else None
 
-    try:
-        # 1. ATTENDI L'ELEMENTO CHIAVE: Aspetta che l'iframe delle stagioni sia caricato.
-        #    Questo conferma che abbiamo superato la pagina "Just a moment..." e siamo sulla pagina reale.
-        iframe_selector = "iframe[src*='streaming-serie-tv']"
-        print(f"{Bcolors.OKCYAN}Attendo il caricamento completo della pagina e del selettore di episodi...{Bcolors.ENDC}")
-        await page.wait_for_selector(iframe_selector, timeout=30000)
-        print(f"{Bcolors.OKGREEN}Pagina della serie caricata correttamente.{Bcolors.ENDC}")
+async def load_series_catalog(pool: PagePool, series_url: str, catalog: CatalogCache | None = None) -> dict | None:
+    """Titolo, pagina di selezione e stagioni (href, etichetta) di una serie, dalla cache se valida."""
+    if catalog is not None and (cached := catalog.get_series(series_url)):
+        print(f"{Bcolors.OKCYAN}Catalogo della serie letto dalla cache: {cached['title']}{Bcolors.ENDC}")
+        return cached
 
-        # 2. ORA È SICURO OTTENERE IL TITOLO: Dato che l'iframe esiste, siamo sulla pagina giusta.
-        series_title = sanitize_filename(await get_page_title(page))
-        print(f"{Bcolors.OKCYAN}Serie rilevata: {series_title}{Bcolors.ENDC}")
+    async with pool.acquire() as page:
+        print(f"{Bcolors.OKGREEN}Apro la pagina della serie: {series_url}{Bcolors.ENDC}")
+        # Aumentiamo il timeout del goto per dare tempo a eventuali reindirizzamenti anti-bot di risolversi
+        with METRICS.span('series_page', series_url):
+            await page.goto(series_url, wait_until='domcontentloaded', timeout=60000)
 
-        # 3. Procedi come prima
-        selection_page_url = await page.locator(iframe_selector).get_attribute("src")
-        await page.goto(selection_page_url)
+        try:
+            # 1. ATTENDI L'ELEMENTO CHIAVE: Aspetta che l'iframe delle stagioni sia caricato.
+            #    Questo conferma che abbiamo superato la pagina "Just a moment..." e siamo sulla pagina reale.
+            iframe_selector = "iframe[src*='streaming-serie-tv']"
+            print(f"{Bcolors.OKCYAN}Attendo il caricamento completo della pagina e del selettore di episodi...{Bcolors.ENDC}")
+            with METRICS.span('series_wait', series_url):
+                await page.wait_for_selector(iframe_selector, timeout=30000)
+            print(f"{Bcolors.OKGREEN}Pagina della serie caricata correttamente.{Bcolors.ENDC}")
 
-    except Exception as e:
-        print(f"{Bcolors.FAIL}Iframe delle stagioni non rilevato o la pagina non si è caricata correttamente: {e}{Bcolors.ENDC}")
-        # Aggiungiamo uno screenshot anche qui per il debug
-        debug_dir = Path.cwd() / "debug_screenshots"
-        ensure_dir(debug_dir)
-        filename = f"error_series_page_{int(time.time())}.png"
-        screenshot_path = debug_dir / filename
-        await page.screenshot(path=screenshot_path, full_page=True)
-        print(f"{Bcolors.WARNING}Screenshot salvato in: {screenshot_path}{Bcolors.ENDC}")
-        return # Esce dalla funzione se non può procedere
-
-    # Il resto della funzione rimane invariato...
-    if seasons_arg == 'all' and episodes_arg == 'all':
-        soup = BeautifulSoup(await page.content(), 'html.parser')
-        seasons = soup.select('div.div_seasons a[href]')
-        if not seasons: print(f"{Bcolors.FAIL}Nessuna stagione trovata.{Bcolors.ENDC}"); return
-        
+            # 2. ORA È SICURO OTTENERE IL TITOLO: Dato che l'iframe esiste, siamo sulla pagina giusta.
+            series_title = sanitize_filename(await get_page_title(page))
+            print(f"{Bcolors.OKCYAN}Serie rilevata: {series_title}{Bcolors.ENDC}")
+
+            # 3. Procedi come prima
+            selection_page_url = await page.locator(iframe_selector).get_attribute("src")
+            with METRICS.span('seasons_page', selection_page_url):
+                await page.goto(selection_page_url)
+
+        except Exception as e:
+            print(f"{Bcolors.FAIL}Iframe delle stagioni non rilevato o la pagina non si è caricata correttamente: {e}{Bcolors.ENDC}")
+            # Aggiungiamo uno screenshot anche qui per il debug
+            debug_dir = Path.cwd() / "debug_screenshots"
+            ensure_dir(debug_dir)
+            filename = f"error_series_page_{int(time.time())}.png"
+            screenshot_path = debug_dir / filename
+            await page.screenshot(path=screenshot_path, full_page=True)
+            print(f"{Bcolors.WARNING}Screenshot salvato in: {screenshot_path}{Bcolors.ENDC}")
+            return None
+
+        seasons = extractor.extract_links(await page.content(), 'div_seasons')
+        if catalog is not None and seasons:
+            catalog.put_series(series_url, series_title, selection_page_url, seasons)
+        if SEARCH_INDEX is not None: SEARCH_INDEX.add([{'title': series_title, 'link': series_url, 'type': "Serie TV"}], replace=False)
+        return {'title': series_title, 'selection_url': selection_page_url, 'seasons': seasons}
+
+async def load_season_episodes(pool: PagePool, series_url: str, season_href: str, catalog: CatalogCache | None = None,
+                               stale_ok: bool = False) -> list[tuple[int, int, int, str, str]]:
+    """Episodi di una stagione come (series_id, stagione, episodio, href, etichetta), dalla cache se validi (o anche scaduti, con `stale_ok`)."""
+    if catalog is not None and (cached := catalog.get_episodes(series_url, season_href, stale_ok)) is not None:
+        return cached
+
+    async with pool.acquire() as page:
+        with METRICS.span('season_page', season_href):
+            await page.goto(season_href)
+        episodes = []
+        for href, label in extractor.extract_links(await page.content(), 'div_episodes'):
+            parsed = _parse_href(href)
+            if parsed and len(parsed) == 3:
+                episodes.append((*parsed, href, label))
+    if catalog is not None:
+        catalog.put_episodes(series_url, season_href, episodes)
+    return episodes
+
+async def resolve_m3u8_link(pool: PagePool, page_url: str, s_num: int = 0, e_num: int = 0, with_title: bool = False) -> tuple[str | None, str | None]:
+    """
+    Come get_m3u8_link, ma prima prova il link in cache verificando con una GET che la
+    playlist sia ancora raggiungibile; solo altrimenti prende una scheda dal pool (e quindi,
+    la prima volta, avvia il browser). Una scheda che esaurisce i tentativi viene sostituita.
+    Restituisce (m3u8, titolo della pagina); il titolo è letto solo con `with_title`.
+    """
+    with METRICS.span('resolve', _episode_label(page_url, s_num, e_num), cached=False) as span:
+        if LINK_CACHE is not None and (cached := LINK_CACHE.get(page_url, s_num, e_num)):
+            m3u8, title = cached
+            if (title or not with_title) and await hls.playlist_is_valid(m3u8, PLAYER_REFERER):
+                print(f"{Bcolors.OKGREEN}Link M3U8 riutilizzato dalla cache.{Bcolors.ENDC}")
+                span['cached'] = True
+                return m3u8, title
+            LINK_CACHE.invalidate(page_url, s_num, e_num)
+
+        async with pool.acquire() as page:
+            m3u8 = await get_m3u8_link(page, page_url, s_num, e_num)
+            title = sanitize_filename(await get_page_title(page)) if m3u8 and with_title else None
+            # Una scheda che ha esaurito i tentativi (CAPTCHA, timeout) viene sostituita.
+            if not m3u8: pool.mark_bad(page)
+        if m3u8 and LINK_CACHE is not None:
+            LINK_CACHE.put(page_url, m3u8, s_num, e_num, title)
+        span['ok'] = m3u8 is not None
+        return m3u8, title
+
+async def enumerate_and_download_series(pool: PagePool, series_url: str, seasons_arg, episodes_arg, outdir: Path, delay: float, jobs: int = 1,
+                                        catalog: CatalogCache | None = None, interactive: bool = True, on_download_start=None,
+                                        progress: JobProgress | None = None) -> int | None:
+    """
+    Enumera gli episodi selezionati e li scarica. Senza `interactive` non chiede mai stagioni
+    o episodi da tastiera. `on_download_start` viene chiamata quando parte la pipeline dei download
+    e `progress`, se presente, viene aggiornato episodio per episodio.
+    Restituisce il numero di episodi non scaricati, oppure None se la serie non è leggibile.
+    """
+    series = await load_series_catalog(pool, series_url, catalog)
+    if series is None: return None # Esce dalla funzione se non può procedere
+    series_title, seasons = series['title'], series['seasons']
+    if not seasons: print(f"{Bcolors.FAIL}Nessuna stagione trovata.{Bcolors.ENDC}"); return None
+
+    if interactive and seasons_arg == 'all' and episodes_arg == 'all':
         print(f"\n{Bcolors.HEADER}--- Stagioni disponibili ---{Bcolors.ENDC}")
-        col_width = max(len(s.text.strip()) for s in seasons) + 1
-        for i, s in enumerate(seasons): print(f"{Bcolors.OKGREEN}| {i+1:<3} | {s.text.strip():<{col_width}} |{Bcolors.ENDC}")
+        col_width = max(len(label) for _, label in seasons) + 1
+        for i, (_, label) in enumerate(seasons): print(f"{Bcolors.OKGREEN}| {i+1:<3} | {label:<{col_width}} |{Bcolors.ENDC}")
         
         seasons_arg = input(f"{Bcolors.OKBLUE}Seleziona stagioni (es. 1,3-4 o 'all'): {Bcolors.ENDC}") or 'all'
         
         if re.match(r"^\d+$", seasons_arg):
             try:
-                await page.goto(seasons[int(seasons_arg) - 1]['href'])
-                ep_soup = BeautifulSoup(await page.content(), 'html.parser')
-                episodes = ep_soup.select('div.div_episodes a[href]')
+                episodes = await load_season_episodes(pool, series_url, seasons[int(seasons_arg) - 1][0], catalog)
                 print(f"\n{Bcolors.HEADER}--- Episodi disponibili ---{Bcolors.ENDC}")
-                col_width = max(len(e.text.strip()) for e in episodes) + 1
-                for i, e in enumerate(episodes): print(f"{Bcolors.OKGREEN}| {i+1:<3} | {e.text.strip():<{col_width}} |{Bcolors.ENDC}")
+                col_width = max(len(e[4]) for e in episodes) + 1
+                for i, e in enumerate(episodes): print(f"{Bcolors.OKGREEN}| {i+1:<3} | {e[4]:<{col_width}} |{Bcolors.ENDC}")
                 episodes_arg = input(f"{Bcolors.OKBLUE}Seleziona episodi (es. 1,3-5 o 'all'): {Bcolors.ENDC}") or 'all'
             except (ValueError, IndexError): pass
-            await page.goto(selection_page_url)
 
     seasons_filter, episodes_filter = parse_selection_arg(seasons_arg), parse_selection_arg(episodes_arg)
     episodes_to_process = []
-    
-    def _parse_href(h): return tuple(map(int, re.findall(r'\d+', h)[-3:])) if 'streaming-serie-tv' in h else None
-    
-    await page.goto(selection_page_url)
-    soup_seasons = BeautifulSoup(await page.content(), 'html.parser')
 
-    for season_link in soup_seasons.select('div.div_seasons a[href]'):
-        parsed = _parse_href(season_link['href'])
+    for season_href, _ in seasons:
+        parsed = _parse_href(season_href)
         if not parsed or (seasons_filter != 'all' and parsed[1] not in seasons_filter): continue
-        
-        await page.goto(season_link['href'])
-        soup_episodes = BeautifulSoup(await page.content(), 'html.parser')
-        for ep_link in soup_episodes.select('div.div_episodes a[href]'):
-            ep_parsed = _parse_href(ep_link['href'])
-            if ep_parsed and (episodes_filter == 'all' or ep_parsed[2] in episodes_filter):
-                episodes_to_process.append((ep_parsed[1], ep_parsed[2], ep_link['href']))
+        for _, s_num, e_num, ep_href, _ in await load_season_episodes(pool, series_url, season_href, catalog):
+            if episodes_filter == 'all' or e_num in episodes_filter:
+                episodes_to_process.append((s_num, e_num, ep_href))
 
+    episodes_to_process = sorted(set(episodes_to_process))
     print(f"\n{Bcolors.OKBLUE}Trovati {len(episodes_to_process)} episodi da scaricare.{Bcolors.ENDC}")
-    for s_num, e_num, ep_url in sorted(list(set(episodes_to_process))):
-        print(f"{Bcolors.HEADER}--- Processing S{s_num:02d}E{e_num:02d} ---{Bcolors.ENDC}")
-        m3u8 = await get_m3u8_link(page, ep_url, s_num, e_num)
-        if m3u8:
+    return await download_episodes(pool, [(series_title, *ep) for ep in episodes_to_process], outdir, delay, jobs, on_download_start, progress)
+
+async def download_episodes(pool: PagePool, episodes: list[tuple[str, int, int, str]], outdir: Path, delay: float, jobs: int = 1,
+                            on_download_start=None, progress: JobProgress | None = None) -> int:
+    """
+    Risolve e scarica gli episodi indicati come (titolo della serie, stagione, episodio, URL), anche
+    di serie diverse. Restituisce il numero di episodi non scaricati.
+    """
+    # Pipeline producer/consumer: le schede del pool continuano a risolvere i link M3U8 degli
+    # episodi successivi mentre fino a `jobs` processi ffmpeg scaricano quelli già pronti.
+    # La coda è limitata per non risolvere link troppo in anticipo (potrebbero scadere).
+    if progress is not None: progress.episodes_total = len(episodes)
+    if on_download_start is not None: on_download_start()
+    jobs = max(1, jobs)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=jobs)
+    workers = [asyncio.create_task(_download_worker(queue, progress)) for _ in range(jobs)]
+    pending = iter(episodes)
+    several_series = len({title for title, *_ in episodes}) > 1
+    unresolved = 0
+
+    async def _resolver() -> None:
+        nonlocal unresolved
+        for series_title, s_num, e_num, ep_url in pending:
+            label = f"{series_title} S{s_num:02d}E{e_num:02d}" if several_series else f"S{s_num:02d}E{e_num:02d}"
+            print(f"{Bcolors.HEADER}--- Processing {label} ---{Bcolors.ENDC}")
             season_dir = outdir / "Serie" / series_title / f"S{s_num:02d}"
-            ensure_dir(season_dir)
-            download_m3u8_to_mp4(m3u8, season_dir / f"{series_title} - S{s_num:02d}E{e_num:02d}.mp4")
-            await asyncio.sleep(delay)
+            output_file = season_dir / f"{series_title} - S{s_num:02d}E{e_num:02d}.mp4"
+            if SKIP_EXISTING and await is_download_complete(output_file):
+                print(f"{Bcolors.OKGREEN}{label} già scaricato, salto.{Bcolors.ENDC}")
+                if progress is not None: progress.episodes_skipped += 1
+                continue
+            m3u8, _ = await resolve_m3u8_link(pool, ep_url, s_num, e_num)
+            if m3u8:
+                ensure_dir(season_dir)
+                await queue.put((m3u8, output_file))
+                await asyncio.sleep(delay)
+            else:
+                unresolved += 1
+                if progress is not None: progress.episodes_failed += 1
+                print(f"{Bcolors.FAIL}Salto {label} - M3U8 non trovato.{Bcolors.ENDC}")
+
+    try:
+        await asyncio.gather(*(_resolver() for _ in range(pool.size)))
+    except BaseException:
+        # Errore o annullamento: si fermano anche i download in corso (ffmpeg viene terminato).
+        for worker in workers: worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        raise
+    for _ in workers: await queue.put(None)
+    failed_downloads = await asyncio.gather(*workers)
+    return unresolved + sum(failed_downloads)
+
+async def download_movie(pool: PagePool, content_link: str, outdir: Path, catalog: CatalogCache | None = None,
+                         on_download_start=None, progress: JobProgress | None = None) -> bool:
+    """
+    Risolve e scarica un film; vero se il file è completo al termine.
+    Il titolo (e quindi il file di destinazione) dei film già visti viene dal catalogo, così un film
+    già scaricato viene saltato prima di risolvere il link M3U8, senza aprire il browser.
+    """
+    if progress is not None: progress.episodes_total = 1
+
+    def _skip_existing(movie_file: Path) -> bool:
+        print(f"{Bcolors.OKGREEN}{movie_file.name} già scaricato, salto.{Bcolors.ENDC}")
+        if progress is not None: progress.episodes_skipped = 1
+        return True
+
+    known_title = catalog.get_movie_title(content_link) if catalog is not None else None
+    if SKIP_EXISTING and known_title:
+        known_file = outdir / "Film" / known_title / f"{known_title}.mp4"
+        if await is_download_complete(known_file): return _skip_existing(known_file)
+    m3u8, title = await resolve_m3u8_link(pool, content_link, with_title=True)
+    if not m3u8:
+        print(f"{Bcolors.FAIL}Impossibile estrarre il link M3U8 per il film.{Bcolors.ENDC}")
+        if progress is not None: progress.episodes_failed = 1
+        return False
+    if catalog is not None and title != known_title: catalog.put_movie_title(content_link, title)
+    if SEARCH_INDEX is not None: SEARCH_INDEX.add([{'title': title, 'link': content_link, 'type': "Film"}], replace=False)
+    movie_dir = outdir / "Film" / title
+    ensure_dir(movie_dir)
+    movie_file = movie_dir / f"{title}.mp4"
+    if SKIP_EXISTING and await is_download_complete(movie_file): return _skip_existing(movie_file)
+    if on_download_start is not None: on_download_start()
+    if progress is not None: progress.downloading.append(movie_file.name)
+    ok = await download_m3u8_to_mp4(m3u8, movie_file)
+    if progress is not None:
+        progress.downloading.clear()
+        if ok: progress.episodes_done = 1
+        else: progress.episodes_failed = 1
+    return ok
+
+def _pick_search_result(results: list[dict], title: str, kind: str | None, pick: int | None) -> dict | None:
+    """Sceglie un risultato senza chiedere: indice esplicito, altrimenti titolo identico, altrimenti il primo."""
+    if kind: results = [r for r in results if (r['type'] == "Serie TV") == kind.lower().startswith("serie")]
+    if pick is not None: return results[pick - 1] if 0 < pick <= len(results) else None
+    return next((r for r in results if r['title'].casefold() == title.strip().casefold()), results[0] if results else None)
+
+def _selection_key(value: str) -> str:
+    """Forma canonica di una selezione (es. '3-1,2' -> '1,2,3'), usata per riconoscere i lavori duplicati."""
+    selected = parse_selection_arg(value)
+    return "all" if selected == "all" else ",".join(str(n) for n in sorted(selected))
+
+def _prepare_job(job: dict) -> dict:
+    job['seasons'], job['episodes'] = _selection_key(job['seasons']), _selection_key(job['episodes'])
+    return job
+
+async def run_job(pool: PagePool, queue: JobQueue, job: dict, outdir: Path, delay: float, jobs: int, catalog: CatalogCache | None,
+                  progress: JobProgress | None = None) -> None:
+    """Esegue un lavoro della coda (ricerca se serve, poi serie o film) e ne registra lo stato finale."""
+    target = job['link'] or job['title']
+    print(f"\n{Bcolors.HEADER}=== Lavoro {job['id']} (priorità {job['priority']}): {target} ==={Bcolors.ENDC}")
+    try:
+        content_link = job['link']
+        if not content_link:
+            # Senza conferma interattiva l'indice vale solo per ricerche già fatte o titoli identici;
+            # con `pick` serve l'ordine dei risultati del sito, quindi solo ricerche già fatte.
+            results, _ = await find_content(pool, job['title'], min_score=1.0 if job['pick'] is None else None)
+            chosen = _pick_search_result(results, job['title'], job['type'], job['pick'])
+            if chosen is None:
+                queue.set_state(job['id'], 'failed', "nessun risultato di ricerca")
+                print(f"{Bcolors.FAIL}Nessun risultato per '{job['title']}'.{Bcolors.ENDC}")
+                return
+            content_link = chosen['link']
+            print(f"{Bcolors.OKCYAN}Risultato scelto: {chosen['title']} ({chosen['type']}){Bcolors.ENDC}")
+
+        job_outdir = Path(job['outdir']) if job['outdir'] else outdir
+        mark_downloading = lambda: queue.set_state(job['id'], 'downloading')
+        if "/serietv/" in content_link:
+            failed = await enumerate_and_download_series(pool, content_link, job['seasons'], job['episodes'], job_outdir, delay, jobs, catalog,
+                                                         interactive=False, on_download_start=mark_downloading, progress=progress)
+            error = "serie non leggibile" if failed is None else (f"{failed} episodi non scaricati" if failed else None)
         else:
-            print(f"{Bcolors.FAIL}Salto S{s_num:02d}E{e_num:02d} - M3U8 non trovato.{Bcolors.ENDC}")
+            error = None if await download_movie(pool, content_link, job_outdir, catalog, mark_downloading, progress) else "download del film non riuscito"
+        queue.set_state(job['id'], 'failed' if error else 'done', error)
+    except Exception as e:
+        queue.set_state(job['id'], 'failed', str(e).splitlines()[0] if str(e) else type(e).__name__)
+        print(f"{Bcolors.FAIL}Lavoro {job['id']} fallito: {e}{Bcolors.ENDC}")
+
+async def run_job_queue(pool: PagePool, queue: JobQueue, outdir: Path, delay: float, jobs: int, catalog: CatalogCache | None) -> None:
+    """Esegue in ordine di priorità tutti i lavori in attesa, con la stessa sessione del browser."""
+    while (job := queue.next()) is not None:
+        await run_job(pool, queue, job, outdir, delay, jobs, catalog)
+
+async def _plan_series_sync(pool: PagePool, title: str, present: set[tuple[int, int]], catalog: CatalogCache) -> list[tuple[str, int, int, str]] | None:
+    """
+    Episodi mancanti di una serie della libreria: quelli delle stagioni già presenti su disco e di
+    tutte le successive. Solo la pagina della serie (secondo --catalog-ttl) e l'ultima stagione
+    vengono rilette dal sito; le stagioni precedenti usano l'elenco in cache anche se scaduto.
+    """
+    series_url = catalog.find_series_url(title)
+    if series_url is None and SEARCH_INDEX is not None:
+        series_url = next((r['link'] for r in SEARCH_INDEX.match(title, 1.0) if r['type'] == "Serie TV"), None)
+    if series_url is None:
+        print(f"{Bcolors.WARNING}{title}: link della serie sconosciuto, saltata (scaricala una volta con --link).{Bcolors.ENDC}")
+        return None
+    # Un errore del sito (timeout, pagina cambiata) su una serie non deve fermare la sincronizzazione delle altre.
+    try:
+        series = await load_series_catalog(pool, series_url, catalog)
+        if series is None: return None
+
+        first_season = min((s for s, _ in present), default=0)
+        seasons = [(href, parsed[1]) for href, _ in series['seasons'] if (parsed := _parse_href(href)) and parsed[1] >= first_season]
+        last_season = max((num for _, num in seasons), default=None)
+        missing = []
+        for season_href, season_num in seasons:
+            for _, s_num, e_num, ep_href, _ in await load_season_episodes(pool, series_url, season_href, catalog, stale_ok=season_num != last_season):
+                if (s_num, e_num) not in present: missing.append((title, s_num, e_num, ep_href))
+    except Exception as e:
+        print(f"{Bcolors.FAIL}{title}: catalogo non leggibile ({str(e).splitlines()[0] if str(e) else type(e).__name__}), saltata.{Bcolors.ENDC}")
+        return None
+    missing = sorted(set(missing))
+    print(f"{Bcolors.OKCYAN}{title}: {len(present)} episodi presenti, {len(missing)} da scaricare.{Bcolors.ENDC}")
+    return missing
+
+async def sync_library(pool: PagePool, outdir: Path, delay: float, jobs: int, catalog: CatalogCache) -> int:
+    """
+    Aggiorna tutte le serie già presenti in `<outdir>/Serie`: confronta i file su disco con il
+    catalogo e scarica, in un'unica pipeline, solo gli episodi mancanti. Restituisce gli episodi non scaricati.
+    """
+    series_on_disk = library.scan_series(outdir)
+    if not series_on_disk:
+        print(f"{Bcolors.WARNING}Nessuna serie trovata in {outdir / 'Serie'}.{Bcolors.ENDC}")
+        return 0
+    print(f"{Bcolors.HEADER}--- Sincronizzazione di {len(series_on_disk)} serie ---{Bcolors.ENDC}")
+    # Conta come presente solo un episodio con manifest completo. I file senza manifest restano in coda:
+    # dopo aver letto la playlist, `_download_m3u8_to_mp4` li confronta con la durata attesa e li salta se coincidono.
+    present = {title: {key for key, file in files.items() if library.download_state(file)} for title, files in series_on_disk.items()}
+    # Le serie vengono enumerate in parallelo, nei limiti delle schede del pool.
+    plans = await asyncio.gather(*(_plan_series_sync(pool, title, present[title], catalog) for title in series_on_disk))
+    skipped = sum(1 for plan in plans if plan is None)
+    missing = [episode for plan in plans if plan for episode in plan]
+    print(f"\n{Bcolors.OKBLUE}Trovati {len(missing)} episodi nuovi o mancanti in {len(series_on_disk) - skipped} serie"
+          f"{f' ({skipped} non sincronizzabili)' if skipped else ''}.{Bcolors.ENDC}")
+    if not missing: return 0
+    return await download_episodes(pool, missing, outdir, delay, jobs)
 
 # =========================================================================
 # FUNZIONE PRINCIPALE (ASINCRONA)
 # =========================================================================
 async def main():
+    global DOWNLOAD_ENGINE, SEGMENT_CONCURRENCY, SEGMENT_RETRIES, MAX_HEIGHT, MAX_BITRATE, MAX_RATE, SCHEDULER, SEARCH_INDEX, RESUME_DOWNLOADS, SKIP_EXISTING, LINK_CACHE, NETWORK_CAPTURE
+    global PROGRESS, TIMING, BASE_URL, SEARCH_URL, PLAYER_REFERER, METRICS
     parser = argparse.ArgumentParser(description='Cerca e scarica contenuti da onlineserietv.com')
     parser.add_argument('--link', type=str, help='Link diretto al contenuto.')
+    parser.add_argument('--jobs-file', type=str, help='File YAML o JSONL con i lavori da eseguire in batch, senza domande interattive.')
+    parser.add_argument('--sync', action='store_true', help="Aggiorna le serie già presenti in <outdir>/Serie scaricando solo gli episodi mancanti o nuovi.")
+    parser.add_argument('--serve', action='store_true', help='Resta in esecuzione con il browser aperto e accetta lavori da una API HTTP locale.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Indirizzo su cui ascolta la API di --serve.')
+    parser.add_argument('--port', type=int, default=8787, help='Porta della API di --serve.')
+    parser.add_argument('--concurrent-jobs', type=int, default=1, help='Lavori eseguiti contemporaneamente in modalità --serve.')
     parser.add_argument('--seasons', '--s', type=str, default='all')
     parser.add_argument('--episodes', '--e', type=str, default='all')
     parser.add_argument('--outdir', type=str, default=str(Path.cwd() / 'Downloads'))
     parser.add_argument('--headless', action=argparse.BooleanOptionalAction, default=True)
     parser.add_argument('--delay', type=float, default=2.0)
+    parser.add_argument('--network-capture', action=argparse.BooleanOptionalAction, default=True, help="Intercetta la richiesta .m3u8 del player; con --no-network-capture legge solo lo script dell'iframe.")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Numero di download ffmpeg in parallelo.')
+    parser.add_argument('--pages', type=int, default=1, help='Schede del browser usate in parallelo per estrarre i link M3U8.')
+    parser.add_argument('--engine', choices=['ffmpeg', 'native'], default='ffmpeg', help="Motore di download: 'ffmpeg' o 'native' (segmenti HLS in parallelo).")
+    parser.add_argument('--segment-concurrency', type=int, default=8, help='Segmenti scaricati in parallelo con --engine native.')
+    parser.add_argument('--segment-retries', type=int, default=5, help='Tentativi per singolo segmento con --engine native.')
+    parser.add_argument('--max-height', type=int, help="Altezza massima (es. 720) della variante scelta dalla master playlist.")
+    parser.add_argument('--max-bitrate', type=int, help="Bitrate massimo in kbit/s della variante scelta dalla master playlist.")
+    parser.add_argument('--max-rate', type=float, help="Banda massima complessiva in MB/s per tutti i download (usa il motore native).")
+    parser.add_argument('--max-host-connections', type=int, default=16, help="Connessioni contemporanee massime verso lo stesso host dei flussi (ridotte in automatico se il server rallenta o risponde 429/5xx).")
+    parser.add_argument('--progress', action=argparse.BooleanOptionalAction, default=True, help="Mostra una riga di avanzamento complessivo dei download in corso (MB/s, ETA, percentuale di ognuno).")
+    parser.add_argument('--progress-interval', type=float, default=0.5, help="Secondi tra un aggiornamento e l'altro della riga di avanzamento e di --progress-file.")
+    parser.add_argument('--progress-file', type=str, help="Scrive lo stato dei download in corso come riga JSON in questo file a ogni aggiornamento.")
+    parser.add_argument('--resume', action='store_true', help='Download riprendibili: checkpoint per segmento in un manifest accanto al file.')
+    parser.add_argument('--overwrite', action='store_true', help='Riscarica anche i file già completi.')
+    parser.add_argument('--catalog-ttl', type=float, default=24.0, help='Validità in ore del catalogo di stagioni ed episodi in cache.')
+    parser.add_argument('--refresh-catalog', action='store_true', help='Ignora il catalogo in cache e rilegge stagioni ed episodi dal sito.')
+    parser.add_argument('--index-ttl', type=float, default=7.0, help="Validità in giorni dell'indice locale dei titoli usato per le ricerche (0 lo disattiva).")
+    parser.add_argument('--base-url', type=str, default=BASE_URL, help='Indirizzo del sito (utile per i test su una copia locale).')
+    parser.add_argument('--referer', type=str, default=PLAYER_REFERER, help='Referer inviato nelle richieste della playlist e dei segmenti.')
+    parser.add_argument('--link-ttl', type=float, default=12.0, help='Ore dopo cui un link M3U8 in cache viene comunque riestratto (0 disattiva la cache).')
+    parser.add_argument('--adaptive-timeouts', action=argparse.BooleanOptionalAction, default=True, help="Ricava i timeout del browser dalle latenze osservate (salvate tra un'esecuzione e l'altra) invece di usare valori fissi.")
+    parser.add_argument('--retry-budget', type=float, default=0.5, help="Nuovi tentativi di estrazione concessi nell'esecuzione, in proporzione agli episodi (oltre a 10 sempre disponibili).")
+    parser.add_argument('--block-resources', action=argparse.BooleanOptionalAction, default=True, help='Interrompe le risorse non necessarie allo scraping (immagini, font, CSS, pubblicità); il player resta escluso.')
+    parser.add_argument('--block-types', type=str, default=",".join(DEFAULT_BLOCKED_TYPES), help='Tipi di risorsa da bloccare, separati da virgole.')
+    parser.add_argument('--block-hosts', type=str, default='', help='Domini aggiuntivi da bloccare, separati da virgole.')
+    parser.add_argument('--profile', action='store_true', help='Misura i tempi di ogni fase e stampa un riepilogo (p50/p95) a fine esecuzione.')
+    parser.add_argument('--metrics-file', type=str, help='Scrive ogni misura come riga JSON in questo file (implica --profile).')
     args = parser.parse_args()
 
+    BASE_URL = args.base_url.rstrip('/')
+    SEARCH_URL = f"{BASE_URL}/?s="
+    PLAYER_REFERER = args.referer
+    METRICS = metrics.Metrics(args.profile, args.metrics_file)
+    run_started = time.perf_counter()
+    NETWORK_CAPTURE = args.network_capture
+    TIMING = TimingPolicy(adaptive=args.adaptive_timeouts, retry_budget=args.retry_budget)
+    if args.link_ttl > 0: LINK_CACHE = LinkCache(ttl_seconds=args.link_ttl * 3600)
+    RESUME_DOWNLOADS = args.resume
+    SKIP_EXISTING = not args.overwrite
+    DOWNLOAD_ENGINE = args.engine
+    SEGMENT_CONCURRENCY = max(1, args.segment_concurrency)
+    SEGMENT_RETRIES = max(1, args.segment_retries)
+    MAX_HEIGHT = args.max_height if args.max_height and args.max_height > 0 else None
+    MAX_BITRATE = args.max_bitrate * 1000 if args.max_bitrate and args.max_bitrate > 0 else None
+    MAX_RATE = args.max_rate * 1e6 if args.max_rate and args.max_rate > 0 else None
+    SCHEDULER = DownloadScheduler(MAX_RATE, args.max_host_connections)
+    PROGRESS = ProgressBoard(args.progress and not DISABLE_PROGRESS, args.progress_interval, args.progress_file, PROGRESS_BAR_COLOR)
+
     print(f"{Bcolors.OKCYAN}Verifica della disponibilità di ffmpeg...{Bcolors.ENDC}")
     if not ensure_ffmpeg():
         print(f"\n{Bcolors.FAIL}Errore critico: ffmpeg/ffprobe sono necessari.{Bcolors.ENDC}")
         sys.exit(1)
     print(f"{Bcolors.OKGREEN}ffmpeg è pronto.{Bcolors.ENDC}\n")
 
-    # Inizializzazione di Camoufox in modalità asincrona
-    async with AsyncCamoufox(
-        headless=args.headless,
-        geoip=True,
-        humanize=True,
-        main_world_eval=True,
-        addons=[os.path.abspath(ADDON_PATH)]
-    ) as browser:
-        context = await browser.new_context()
-        page = await context.new_page()
-
-        content_link = args.link
-        if not content_link:
-            title = input(f"{Bcolors.OKBLUE}Benvenuto! Inserisci il titolo da cercare: {Bcolors.ENDC}")
-            results = await search_content(page, title)
-            if not results:
-                print(f"{Bcolors.FAIL}Nessun risultato per '{title}'.{Bcolors.ENDC}")
-                sys.exit()
-
-            print(f"\n{Bcolors.HEADER}--- Risultati della ricerca ---{Bcolors.ENDC}")
-            name_w = max(len(r['title']) for r in results)
-            type_w = max(len(r['type']) for r in results)
-            print(f"{Bcolors.OKCYAN}| {'Idx':<3} | {'Titolo':<{name_w}} | {'Tipo':<{type_w}} |{Bcolors.ENDC}")
-            print(f"{Bcolors.HEADER}{'-'*(13+name_w+type_w)}{Bcolors.ENDC}")
-            for i, r in enumerate(results):
-                color = Bcolors.OKGREEN if r['type'] == "Serie TV" else Bcolors.WARNING
-                print(f"{color}| {i+1:<3} | {r['title']:<{name_w}} | {r['type']:<{type_w}} |{Bcolors.ENDC}")
-            
-            try:
-                sel = input(f"{Bcolors.OKBLUE}Scegli un numero (o 'q' per uscire): {Bcolors.ENDC}")
-                if sel.lower() == 'q': sys.exit()
-                content_link = results[int(sel) - 1]['link']
-            except (ValueError, IndexError):
-                print(f"{Bcolors.FAIL}Selezione non valida.{Bcolors.ENDC}")
-                sys.exit()
-
-        if content_link:
-            outdir = Path(args.outdir)
-            if "/serietv/" in content_link:
-                await enumerate_and_download_series(page, content_link, args.seasons, args.episodes, outdir, args.delay)
-            else:
-                m3u8 = await get_m3u8_link(page, content_link)
-                if m3u8:
-                    title = sanitize_filename(await get_page_title(page))
-                    movie_dir = outdir / "Film" / title
-                    ensure_dir(movie_dir)
-                    download_m3u8_to_mp4(m3u8, movie_dir / f"{title}.mp4")
+    catalog = CatalogCache(ttl_seconds=args.catalog_ttl * 3600, refresh=args.refresh_catalog)
+    if args.index_ttl > 0: SEARCH_INDEX = SearchIndex(ttl_seconds=args.index_ttl * 24 * 3600, refresh=args.refresh_catalog)
+
+    job_queue = None
+    if args.jobs_file:
+        try: new_jobs = load_jobs_file(Path(args.jobs_file))
+        except (OSError, ValueError) as e:
+            print(f"{Bcolors.FAIL}File dei lavori non valido: {e}{Bcolors.ENDC}")
+            sys.exit(1)
+        job_queue = JobQueue()
+        requeued = job_queue.requeue_interrupted()
+        for job in new_jobs: job_queue.add(_prepare_job(job))
+        counts = job_queue.counts()
+        print(f"{Bcolors.OKCYAN}{len(new_jobs)} lavori letti da {args.jobs_file}; in coda: {counts['pending']} (ripresi dopo un'interruzione: {requeued}), già completati: {counts['done']}.{Bcolors.ENDC}")
+
+    request_filter = None
+    async with contextlib.AsyncExitStack() as stack:
+        async def open_browser_context():
+            # Camoufox viene importato e avviato solo alla prima pagina richiesta: se file
+            # esistenti e link in cache bastano, il browser non parte affatto.
+            nonlocal request_filter
+            from camoufox import AsyncCamoufox
+            print(f"{Bcolors.OKCYAN}Avvio del browser...{Bcolors.ENDC}")
+            browser = await stack.enter_async_context(AsyncCamoufox(
+                headless=args.headless,
+                geoip=True,
+                humanize=True,
+                main_world_eval=True,
+                addons=[browser_addon_path()]
+            ))
+            context = await browser.new_context()
+            if args.block_resources:
+                extra_hosts = tuple(h.strip() for h in args.block_hosts.split(',') if h.strip())
+                request_filter = RequestFilter(PLAYER_HOSTS, [t.strip() for t in args.block_types.split(',') if t.strip()], DEFAULT_BLOCKED_HOSTS + extra_hosts)
+                await request_filter.install(context)
+            return context
+
+        pool = PagePool.lazy(open_browser_context, args.pages)
+
+        if args.serve:
+            await pool.ensure_started()  # il servizio tiene il browser sempre pronto
+            job_queue = job_queue or JobQueue()
+            daemon = DownloadDaemon(job_queue, lambda job, progress: run_job(pool, job_queue, job, Path(args.outdir), args.delay, args.jobs, catalog, progress),
+                                    args.concurrent_jobs, _prepare_job, transfers=lambda: PROGRESS.snapshot())
+            print(f"{Bcolors.OKGREEN}Servizio in ascolto su http://{args.host}:{args.port}/ (Ctrl+C per terminare).{Bcolors.ENDC}")
+            try: await daemon.serve(args.host, args.port)
+            except asyncio.CancelledError: pass
+        elif job_queue is not None:
+            await run_job_queue(pool, job_queue, Path(args.outdir), args.delay, args.jobs, catalog)
+        elif args.sync:
+            failed = await sync_library(pool, Path(args.outdir), args.delay, args.jobs, catalog)
+            if failed: print(f"{Bcolors.WARNING}{failed} episodi non scaricati: verranno ritentati alla prossima sincronizzazione.{Bcolors.ENDC}")
+        else:
+            content_link = args.link
+            if not content_link:
+                title = input(f"{Bcolors.OKBLUE}Benvenuto! Inserisci il titolo da cercare: {Bcolors.ENDC}")
+                results, from_index = await find_content(pool, title)
+                while True:
+                    if not results:
+                        print(f"{Bcolors.FAIL}Nessun risultato per '{title}'.{Bcolors.ENDC}")
+                        sys.exit()
+
+                    print(f"\n{Bcolors.HEADER}--- Risultati della ricerca{' (indice locale)' if from_index else ''} ---{Bcolors.ENDC}")
+                    name_w = max(len(r['title']) for r in results)
+                    type_w = max(len(r['type']) for r in results)
+                    print(f"{Bcolors.OKCYAN}| {'Idx':<3} | {'Titolo':<{name_w}} | {'Tipo':<{type_w}} |{Bcolors.ENDC}")
+                    print(f"{Bcolors.HEADER}{'-'*(13+name_w+type_w)}{Bcolors.ENDC}")
+                    for i, r in enumerate(results):
+                        color = Bcolors.OKGREEN if r['type'] == "Serie TV" else Bcolors.WARNING
+                        print(f"{color}| {i+1:<3} | {r['title']:<{name_w}} | {r['type']:<{type_w}} |{Bcolors.ENDC}")
+
+                    online_hint = "'o' per cercare sul sito, " if from_index else ""
+                    sel = input(f"{Bcolors.OKBLUE}Scegli un numero ({online_hint}'q' per uscire): {Bcolors.ENDC}")
+                    if sel.lower() == 'q': sys.exit()
+                    if from_index and sel.lower() == 'o':
+                        results, from_index = await find_content(pool, title, use_index=False)
+                        continue
+                    try: content_link = results[int(sel) - 1]['link']
+                    except (ValueError, IndexError):
+                        print(f"{Bcolors.FAIL}Selezione non valida.{Bcolors.ENDC}")
+                        sys.exit()
+                    break
+
+            if content_link:
+                outdir = Path(args.outdir)
+                if "/serietv/" in content_link:
+                    await enumerate_and_download_series(pool, content_link, args.seasons, args.episodes, outdir, args.delay, args.jobs, catalog)
                 else:
-                    print(f"{Bcolors.FAIL}Impossibile estrarre il link M3U8 per il film.{Bcolors.ENDC}")
-    
+                    await download_movie(pool, content_link, outdir, catalog)
+
+    if not pool.started:
+        print(f"\n{Bcolors.OKGREEN}Browser non avviato: tutto è stato servito da file esistenti o dalla cache.{Bcolors.ENDC}")
+    if job_queue is not None:
+        counts = job_queue.counts()
+        print(f"\n{Bcolors.OKCYAN}Lavori completati: {counts['done']}, falliti: {counts['failed']}, ancora in coda: {counts['pending']}.{Bcolors.ENDC}")
+        job_queue.close()
+    if request_filter is not None:
+        print(f"\n{Bcolors.OKCYAN}Richieste del browser: {request_filter.allowed} consentite, {request_filter.blocked} bloccate.{Bcolors.ENDC}")
+    PROGRESS.close()
+    if PROGRESS.completed or PROGRESS.failed:
+        print(f"\n{Bcolors.OKCYAN}Download: {PROGRESS.completed} completati, {PROGRESS.failed} falliti, {PROGRESS.total_bytes() / 1e6:.1f} MB trasferiti.{Bcolors.ENDC}")
+        if args.progress_file: print(f"{Bcolors.OKCYAN}Avanzamento salvato in: {args.progress_file}{Bcolors.ENDC}")
+    if TIMING.retries_denied:
+        print(f"\n{Bcolors.WARNING}Budget dei nuovi tentativi esaurito: {TIMING.retries_denied} tentativi non eseguiti (vedi --retry-budget).{Bcolors.ENDC}")
+    timing_stats = TIMING.summary()
+    TIMING.close()
+    scheduler_stats = SCHEDULER.stats()
+    if scheduler_stats['throttle_events'] or scheduler_stats['rate_wait_s']:
+        print(f"\n{Bcolors.OKCYAN}Scheduler dei download: {scheduler_stats['throttle_events']} rallentamenti del server, "
+              f"minimo {scheduler_stats['min_host_connections']} connessioni per host, {scheduler_stats['rate_wait_s']:.1f}s di attesa per il limite di banda.{Bcolors.ENDC}")
+    if METRICS.enabled:
+        METRICS.record('run', time.perf_counter() - run_started, **(request_filter.stats() if request_filter else {}), **scheduler_stats, timing=timing_stats)
+        print(f"\n{Bcolors.HEADER}--- Riepilogo dei tempi ---{Bcolors.ENDC}")
+        print(METRICS.summary())
+        if args.metrics_file: print(f"{Bcolors.OKCYAN}Metriche salvate in: {args.metrics_file}{Bcolors.ENDC}")
+        METRICS.close()
+
     print(f"\n{Bcolors.OKGREEN}--- Fine del programma ---{Bcolors.ENDC}")
 
 if __name__ == "__main__":
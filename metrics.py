@@ -0,0 +1,78 @@
+# Strumentazione dei tempi per fase (--profile / --metrics-file).
+# Ogni span registra fase, elemento (episodio, URL...), durata ed eventuali campi extra
+# (tentativi, byte trasferiti...); con un file di metriche ogni span viene scritto subito
+# come una riga JSON, e a fine esecuzione summary() riassume p50/p95 per fase.
+
+import json
+import math
+import time
+from contextlib import contextmanager
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    """Percentile nearest-rank su una lista già ordinata."""
+    if not sorted_values: return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class Metrics:
+    """Raccoglitore degli span; se disattivato, span() non registra nulla."""
+
+    def __init__(self, enabled: bool = False, path: str | None = None):
+        self.enabled = enabled or path is not None
+        self.spans: list[dict] = []
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+
+    @contextmanager
+    def span(self, stage: str, item: str | None = None, **fields):
+        """
+        Misura il blocco `with`. Il dizionario restituito può essere arricchito dentro il blocco
+        (es. `s['attempts'] = 2`); se il blocco solleva un'eccezione lo span ha ok=False.
+        """
+        if not self.enabled:
+            yield fields
+            return
+        start, ok = time.perf_counter(), True
+        try:
+            yield fields
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, item, **{'ok': ok, **fields})
+
+    def record(self, stage: str, seconds: float, item: str | None = None, **fields) -> None:
+        if not self.enabled: return
+        entry = {'ts': round(time.time(), 3), 'stage': stage, 'item': item, 'seconds': round(seconds, 4), **fields}
+        if fields.get('bytes') and seconds > 0:
+            entry['mb_per_s'] = round(fields['bytes'] / seconds / 1e6, 3)
+        self.spans.append(entry)
+        if self._file is not None:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def summary(self, slowest: int = 5) -> str:
+        """Tabella per fase (conteggio, totale, p50, p95, massimo, errori, MB/s) e gli elementi più lenti."""
+        by_stage: dict[str, list[dict]] = {}
+        for entry in self.spans: by_stage.setdefault(entry['stage'], []).append(entry)
+        lines = [f"{'Fase':<16} {'N':>5} {'Totale s':>9} {'p50 s':>8} {'p95 s':>8} {'Max s':>8} {'Errori':>6} {'MB/s':>7}"]
+        for stage, entries in sorted(by_stage.items(), key=lambda kv: -sum(e['seconds'] for e in kv[1])):
+            durations = sorted(e['seconds'] for e in entries)
+            total = sum(durations)
+            moved = sum(e.get('bytes') or 0 for e in entries)
+            throughput = f"{moved / total / 1e6:.2f}" if moved and total else ""
+            errors = sum(1 for e in entries if e.get('ok') is False)
+            lines.append(f"{stage:<16} {len(entries):>5} {total:>9.2f} {_percentile(durations, 50):>8.2f} "
+                         f"{_percentile(durations, 95):>8.2f} {durations[-1]:>8.2f} {errors:>6} {throughput:>7}")
+        ranked = sorted((e for e in self.spans if e['item'] and e['stage'] != 'run'), key=lambda e: -e['seconds'])[:slowest]
+        if ranked:
+            lines.append("")
+            lines.append("Elementi più lenti:")
+            for e in ranked:
+                extra = ", ".join(f"{k}={e[k]}" for k in ('attempts', 'source', 'bytes', 'mb_per_s') if e.get(k) is not None)
+                lines.append(f"  {e['seconds']:>8.2f}s  {e['stage']:<14} {e['item']}" + (f"  ({extra})" if extra else ""))
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
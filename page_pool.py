@@ -0,0 +1,80 @@
+# Pool di schede (pagine) aperte nello stesso contesto del browser.
+# Permette di estrarre più link M3U8 in parallelo senza lanciare altri browser:
+# le pagine condividono i cookie anti-bot del contesto e vengono ricreate quando
+# finiscono su un CAPTCHA, vanno in timeout o risultano chiuse.
+# Con PagePool.lazy() il browser viene avviato solo alla prima richiesta di una pagina:
+# se tutto è servito da file esistenti o link in cache, non parte affatto.
+
+import asyncio
+from contextlib import asynccontextmanager
+
+class PagePool:
+    def __init__(self, context, size: int = 1, pages: list | None = None):
+        self.context = context
+        self.size = max(1, size)
+        self._initial = list(pages or [])[:self.size]
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._bad: set[int] = set()
+        self._open_context = None
+        self._start_lock = asyncio.Lock()
+        self.started = False
+        self.recycled = 0
+
+    @classmethod
+    def lazy(cls, open_context, size: int = 1) -> 'PagePool':
+        """Pool senza contesto: `open_context()` (coroutine) lo crea alla prima acquire()."""
+        pool = cls(None, size)
+        pool._open_context = open_context
+        return pool
+
+    async def start(self) -> 'PagePool':
+        for page in self._initial:
+            self._idle.put_nowait(page)
+        for _ in range(self.size - len(self._initial)):
+            self._idle.put_nowait(await self.context.new_page())
+        self.started = True
+        return self
+
+    async def ensure_started(self) -> None:
+        async with self._start_lock:
+            if self.started: return
+            if self.context is None: self.context = await self._open_context()
+            await self.start()
+
+    def mark_bad(self, page) -> None:
+        """Segnala una pagina da sostituire quando verrà restituita al pool."""
+        self._bad.add(id(page))
+
+    async def _replace(self, page):
+        try: await page.close()
+        except Exception: pass
+        self.recycled += 1
+        return await self.context.new_page()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Presta una pagina sana; se il blocco fallisce o la pagina è segnalata, viene ricreata."""
+        if not self.started: await self.ensure_started()
+        page = await self._idle.get()
+        try:
+            if page.is_closed(): page = await self._replace(page)
+        except Exception:
+            self._idle.put_nowait(page)
+            raise
+        failed = False
+        try:
+            yield page
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            if failed or id(page) in self._bad or page.is_closed():
+                self._bad.discard(id(page))
+                try: page = await self._replace(page)
+                except Exception: pass
+            self._idle.put_nowait(page)
+
+    async def close(self) -> None:
+        while not self._idle.empty():
+            try: await self._idle.get_nowait().close()
+            except Exception: pass
@@ -0,0 +1,149 @@
+# Avanzamento aggregato dei download in corso.
+# Ogni download registra il proprio stato (secondi di video scritti, byte, velocità, bitrate)
+# letto dall'output `-progress` di ffmpeg o dai segmenti del motore nativo; un unico ticker
+# ridisegna a intervalli fissi una sola riga con il totale (MB/s, ETA e percentuale di ogni
+# download), così il costo del disegno non cresce con il numero di download né con la
+# frequenza degli aggiornamenti. Lo stesso stato può essere scritto come JSON Lines
+# (--progress-file) o letto da snapshot() (es. dalla API di --serve).
+
+import asyncio
+import json
+import time
+from dataclasses import asdict, dataclass, field
+
+@dataclass
+class TransferState:
+    """Stato di un singolo download."""
+    name: str
+    engine: str
+    total_seconds: float | None = None  # durata del flusso, se nota
+    position: float = 0.0  # secondi di video già scritti
+    bytes: int = 0
+    speed: float | None = None  # multiplo del tempo reale (es. 12.5 = 12.5 secondi di video al secondo)
+    bitrate_kbps: float | None = None
+    started_at: float = field(default_factory=time.monotonic)
+    finished: bool = False
+    ok: bool | None = None
+
+    @property
+    def fraction(self) -> float | None:
+        return min(1.0, self.position / self.total_seconds) if self.total_seconds else None
+
+    @property
+    def eta_seconds(self) -> float | None:
+        speed = self.speed or (self.position / (time.monotonic() - self.started_at) if self.position else None)
+        if not self.total_seconds or not speed: return None
+        return max(0.0, self.total_seconds - self.position) / speed
+
+    def apply_ffmpeg_progress(self, key: str, value: str) -> None:
+        """Aggiorna lo stato da una riga `chiave=valore` di `ffmpeg -progress`."""
+        try:
+            if key == 'out_time_us' or key == 'out_time_ms':  # entrambe in microsecondi
+                self.position = max(self.position, int(value) / 1_000_000)
+            elif key == 'total_size': self.bytes = int(value)
+            elif key == 'speed' and value.endswith('x'): self.speed = float(value[:-1])
+            elif key == 'bitrate' and value.endswith('kbits/s'): self.bitrate_kbps = float(value[:-len('kbits/s')])
+        except ValueError: pass  # es. "N/A" all'inizio del flusso
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop('started_at')
+        data['fraction'], data['eta_seconds'] = self.fraction, self.eta_seconds
+        return data
+
+def _format_eta(seconds: float | None) -> str:
+    if seconds is None: return "--:--"
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+class ProgressBoard:
+    """Registro dei download in corso con un solo ticker per il disegno e per il file JSON Lines."""
+
+    def __init__(self, render: bool = True, interval: float = 0.5, path: str | None = None, colour: str | None = None):
+        self.render = render
+        self.interval = max(0.05, interval)
+        self.colour = colour
+        self.active: list[TransferState] = []
+        self.completed = 0
+        self.failed = 0
+        self.bytes_done = 0  # byte dei download già terminati
+        self.mb_per_s = 0.0
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+        self._bar = None
+        self._ticker: asyncio.Task | None = None
+        self._last_bytes = 0
+        self._last_tick = time.monotonic()
+
+    def start(self, name: str, engine: str, total_seconds: float | None = None) -> TransferState:
+        state = TransferState(name, engine, total_seconds)
+        self.active.append(state)
+        if self._ticker is None or self._ticker.done():
+            self._last_bytes, self._last_tick = self.total_bytes(), time.monotonic()
+            self._ticker = asyncio.get_running_loop().create_task(self._tick())
+        return state
+
+    def finish(self, state: TransferState, ok: bool) -> None:
+        state.finished, state.ok = True, ok
+        if state in self.active: self.active.remove(state)
+        self.bytes_done += state.bytes
+        if ok: self.completed += 1
+        else: self.failed += 1
+
+    def total_bytes(self) -> int:
+        return self.bytes_done + sum(s.bytes for s in self.active)
+
+    def snapshot(self) -> dict:
+        etas = [eta for s in self.active if (eta := s.eta_seconds) is not None]
+        return {
+            'ts': round(time.time(), 3), 'active': len(self.active), 'completed': self.completed, 'failed': self.failed,
+            'bytes': self.total_bytes(), 'mb_per_s': round(self.mb_per_s, 3),
+            'eta_seconds': round(max(etas), 1) if etas else None,
+            'downloads': [s.to_dict() for s in self.active],
+        }
+
+    async def _tick(self) -> None:
+        while self.active:
+            await asyncio.sleep(self.interval)
+            self._emit()
+        self._close_bar()
+
+    def _emit(self) -> None:
+        now = time.monotonic()
+        moved, elapsed = self.total_bytes() - self._last_bytes, now - self._last_tick
+        if elapsed > 0:
+            rate = max(0, moved) / elapsed / 1e6
+            self.mb_per_s = rate if not self.mb_per_s else 0.7 * self.mb_per_s + 0.3 * rate
+        self._last_bytes, self._last_tick = self.total_bytes(), now
+        snapshot = self.snapshot()
+        if self._file is not None:
+            self._file.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+            self._file.flush()
+        if self.render and self.active: self._draw(snapshot)
+
+    def _draw(self, snapshot: dict) -> None:
+        if self._bar is None:
+            from tqdm import tqdm
+            args = {"total": 1, "dynamic_ncols": True, "leave": False, "bar_format": "{percentage:3.0f}%|{bar}| {desc}"}
+            try: self._bar = tqdm(colour=self.colour, **args)
+            except TypeError: self._bar = tqdm(**args)
+        known = [s for s in self.active if s.total_seconds]
+        total = sum(s.total_seconds for s in known)
+        self._bar.total = max(1, round(total))
+        self._bar.n = min(self._bar.total, round(sum(min(s.position, s.total_seconds) for s in known)))
+        jobs = "  ".join(f"{s.name} {s.fraction:.0%}" if s.fraction is not None else f"{s.name} {s.bytes / 1e6:.0f}MB" for s in self.active)
+        self._bar.set_description_str(f"{len(self.active)} download, {snapshot['mb_per_s']:.1f} MB/s, ETA {_format_eta(snapshot['eta_seconds'])} | {jobs}", refresh=False)
+        self._bar.refresh()
+
+    def _close_bar(self) -> None:
+        if self._bar is not None:
+            self._bar.close()
+            self._bar = None
+
+    def close(self) -> None:
+        if self._ticker is not None and not self._ticker.done(): self._ticker.cancel()
+        self._close_bar()
+        if self._file is not None:
+            self._file.write(json.dumps(self.snapshot(), ensure_ascii=False) + "\n")
+            self._file.close()
+            self._file = None
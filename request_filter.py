@@ -0,0 +1,67 @@
+# Filtro delle richieste del browser durante la navigazione.
+# Il percorso di scraping legge solo il DOM di poche pagine e l'iframe del player: immagini,
+# font, fogli di stile e script di pubblicità/tracciamento vengono interrotti a livello di
+# contesto (vale per tutte le schede e i frame), mentre tutto ciò che parte dal player resta
+# consentito.
+
+import urllib.parse
+
+DEFAULT_BLOCKED_TYPES = ("image", "font", "stylesheet", "media")
+DEFAULT_BLOCKED_HOSTS = (
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "google-analytics.com",
+    "googletagmanager.com", "googletagservices.com", "adservice.google.com", "facebook.net",
+    "facebook.com", "scorecardresearch.com", "quantserve.com", "hotjar.com", "criteo.com",
+    "taboola.com", "outbrain.com", "amazon-adsystem.com", "adnxs.com", "popads.net",
+    "propellerads.com", "onclickads.net", "histats.com", "cloudflareinsights.com",
+)
+# Risorse necessarie anche se il loro tipo è bloccato (es. l'immagine da cliccare per avviare il player).
+DEFAULT_ALLOWED_URLS = ("player.png",)
+
+def _host_matches(host: str, patterns) -> bool:
+    return any(host == p or host.endswith("." + p) for p in patterns)
+
+class RequestFilter:
+    """Decide per ogni richiesta se interromperla e tiene il conto di quelle bloccate e consentite."""
+
+    def __init__(self, allowed_hosts=(), blocked_types=DEFAULT_BLOCKED_TYPES, blocked_hosts=DEFAULT_BLOCKED_HOSTS, allowed_urls=DEFAULT_ALLOWED_URLS):
+        self.allowed_hosts = tuple(allowed_hosts)
+        self.blocked_types = frozenset(blocked_types)
+        self.blocked_hosts = tuple(blocked_hosts)
+        self.allowed_urls = tuple(allowed_urls)
+        self.allowed = 0
+        self.blocked = 0
+        self.blocked_by_type: dict[str, int] = {}
+
+    def _from_allowed_frame(self, request) -> bool:
+        try: frame = request.frame
+        except Exception: return False
+        while frame is not None:
+            if _host_matches(urllib.parse.urlparse(frame.url).hostname or '', self.allowed_hosts): return True
+            frame = frame.parent_frame
+        return False
+
+    def should_block(self, request) -> bool:
+        host = urllib.parse.urlparse(request.url).hostname or ''
+        if _host_matches(host, self.allowed_hosts) or any(u in request.url for u in self.allowed_urls): return False
+        if _host_matches(host, self.blocked_hosts): return True
+        if request.resource_type not in self.blocked_types: return False
+        return not self._from_allowed_frame(request)
+
+    async def _handle(self, route) -> None:
+        request = route.request
+        if self.should_block(request):
+            self.blocked += 1
+            self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+            try: await route.abort()
+            except Exception: pass  # scheda o frame già chiusi
+        else:
+            self.allowed += 1
+            try: await route.continue_()
+            except Exception: pass
+
+    async def install(self, context) -> "RequestFilter":
+        await context.route("**/*", self._handle)
+        return self
+
+    def stats(self) -> dict:
+        return {'requests_allowed': self.allowed, 'requests_blocked': self.blocked, 'blocked_by_type': dict(self.blocked_by_type)}
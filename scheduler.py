@@ -0,0 +1,186 @@
+# Coordinamento dei download paralleli: un unico scheduler condiviso da tutti i worker.
+# - limite di banda globale (token bucket, --max-rate), applicato a ogni segmento scaricato;
+# - limite di connessioni per host (la CDN dietro i link M3U8), --max-host-connections;
+# - priorità: a parità di host le richieste dei download partiti prima (quindi gli episodi
+#   precedenti) e, al loro interno, i segmenti precedenti passano per primi;
+# - limitazione adattiva: risposte 429/5xx, errori di rete o rallentamenti marcati dimezzano
+#   le connessioni verso quell'host (con una pausa se il server indica Retry-After), che poi
+#   risalgono di una unità ogni `limite` risposte andate a buon fine.
+
+import asyncio
+import heapq
+import itertools
+import time
+import urllib.parse
+from contextlib import asynccontextmanager
+
+THROTTLE_STATUSES = (429, 503)
+SLOW_FACTOR = 4.0  # una risposta è "lenta" se dura più di SLOW_FACTOR volte la media recente...
+SLOW_MIN_SECONDS = 2.0  # ...e comunque più di questi secondi
+MAX_PAUSE_SECONDS = 60.0
+
+class TokenBucket:
+    """Limite di banda in byte/s. Il consumo si registra a trasferimento avvenuto: il debito fa attendere le richieste successive."""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def wait(self) -> None:
+        async with self._lock:
+            self._refill()
+            if self.tokens < 0:
+                delay = -self.tokens / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+                self._refill()
+
+    def consume(self, nbytes: int) -> None:
+        self._refill()
+        self.tokens -= nbytes
+
+class _HostLimiter:
+    """Semaforo a priorità con limite variabile (AIMD) per un singolo host."""
+
+    def __init__(self, limit: int):
+        self.max_limit = self.limit = self.min_seen = max(1, limit)
+        self.active = 0
+        self.successes = 0
+        self.throttled = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.ewma: float | None = None
+        self.samples = 0
+        self._waiters: list = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority) -> None:
+        if self.active < self.limit and not self._waiters: self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), future))
+            self._wake()  # scarta le attese annullate rimaste in testa
+            try: await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled(): self.release()
+                raise
+        try:
+            delay = self.paused_until - time.monotonic()
+            if delay > 0: await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.active < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done(): continue  # attesa annullata
+            self.active += 1
+            future.set_result(None)
+
+    def _decrease(self, pause: float = 0.0) -> None:
+        now = time.monotonic()
+        self.throttled += 1
+        self.successes = 0
+        if pause: self.paused_until = max(self.paused_until, now + min(pause, MAX_PAUSE_SECONDS))
+        # Più richieste in volo possono fallire insieme: si dimezza al più una volta al secondo.
+        if now - self.last_decrease < 1.0: return
+        self.last_decrease = now
+        self.limit = max(1, self.limit // 2)
+        self.min_seen = min(self.min_seen, self.limit)
+
+    def on_success(self, seconds: float) -> None:
+        slow = self.samples >= 5 and seconds > max(SLOW_MIN_SECONDS, SLOW_FACTOR * self.ewma)
+        self.ewma = seconds if self.ewma is None else 0.8 * self.ewma + 0.2 * seconds
+        self.samples += 1
+        if slow:
+            self._decrease()
+            return
+        self.successes += 1
+        if self.successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self.successes = 0
+            self._wake()
+
+    def on_failure(self, status: int | None, retry_after: str | None) -> None:
+        if status is not None and status not in THROTTLE_STATUSES and status < 500: return  # es. 404: non è congestione
+        try: pause = float(retry_after) if retry_after else 1.0
+        except ValueError: pause = 1.0
+        self._decrease(pause)
+
+class DownloadScheduler:
+    """Scheduler condiviso: `slot()` intorno a ogni richiesta, `hold()` per i processi (ffmpeg) che gestiscono da sé il trasferimento."""
+
+    def __init__(self, max_rate: float | None = None, max_host_connections: int = 16):
+        self.bucket = TokenBucket(max_rate) if max_rate else None
+        self.max_host_connections = max(1, max_host_connections)
+        self.hosts: dict[str, _HostLimiter] = {}
+        self.bytes = 0
+        self._tickets = itertools.count()
+
+    def ticket(self) -> int:
+        """
+        Priorità di un nuovo download: numeri più bassi (download partiti prima) vengono serviti per primi.
+        Le richieste usano la coppia (ticket, indice del segmento), con -1 per playlist e segmento di init.
+        """
+        return next(self._tickets)
+
+    def _host(self, url: str) -> _HostLimiter:
+        host = urllib.parse.urlparse(url).hostname or ''
+        if host not in self.hosts: self.hosts[host] = _HostLimiter(self.max_host_connections)
+        return self.hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str, priority=(0, 0)):
+        """
+        Attende una connessione libera verso l'host (in ordine di priorità) e la banda disponibile.
+        Il blocco `with` deve riempire il dizionario restituito con `status`, `bytes` e, se presente,
+        `retry_after`: servono per il conteggio della banda e per la limitazione adattiva.
+        """
+        limiter = self._host(url)
+        await limiter.acquire(priority)
+        outcome = {'status': None, 'bytes': 0, 'retry_after': None}
+        try:
+            if self.bucket is not None: await self.bucket.wait()
+            start = time.monotonic()
+            yield outcome
+            if outcome['status'] in THROTTLE_STATUSES or (outcome['status'] or 0) >= 500:
+                limiter.on_failure(outcome['status'], outcome['retry_after'])
+            else: limiter.on_success(time.monotonic() - start)
+        except asyncio.CancelledError: raise
+        except Exception:
+            limiter.on_failure(outcome['status'], outcome['retry_after'])
+            raise
+        finally:
+            limiter.release()
+            self.bytes += outcome['bytes']
+            if self.bucket is not None and outcome['bytes']: self.bucket.consume(outcome['bytes'])
+
+    @asynccontextmanager
+    async def hold(self, url: str, priority=(0, 0)):
+        """Occupa una connessione verso l'host per tutta la durata del blocco, senza misurarlo."""
+        limiter = self._host(url)
+        await limiter.acquire(priority)
+        try: yield
+        finally: limiter.release()
+
+    def stats(self) -> dict:
+        return {
+            'bytes_scheduled': self.bytes,
+            'throttle_events': sum(h.throttled for h in self.hosts.values()),
+            'min_host_connections': min((h.min_seen for h in self.hosts.values()), default=self.max_host_connections),
+            'rate_wait_s': round(self.bucket.waited, 2) if self.bucket else 0.0,
+        }
@@ -0,0 +1,151 @@
+# Indice locale del catalogo del sito per le ricerche senza browser.
+# Ogni risultato visto (pagine di ricerca, pagine delle serie aperte) viene salvato con titolo,
+# link, tipo e, se ricavabile, anno; le ricerche fatte sul sito vengono ricordate con l'ordine
+# dei risultati. Una nuova ricerca viene risolta dall'indice (ricerca già fatta, titolo identico,
+# prefisso o corrispondenza approssimata) e va sul sito solo se l'indice non ha risposte valide.
+
+import difflib
+import json
+import re
+import time
+import unicodedata
+from pathlib import Path
+
+from cache import DEFAULT_DB_PATH, open_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS titles (
+    link TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    type TEXT NOT NULL,
+    year INTEGER,
+    seen_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS searches (
+    query TEXT PRIMARY KEY,
+    links TEXT NOT NULL,
+    searched_at REAL NOT NULL
+);
+"""
+
+FUZZY_MIN_RATIO = 0.8  # somiglianza minima (0-1) di ogni parola cercata con una parola del titolo
+_YEAR_RE = re.compile(r'\b(19[0-9]{2}|20[0-9]{2})\b')
+
+def normalize(text: str) -> str:
+    """Minuscole, senza accenti né punteggiatura: 'L'Età dell'Oro' -> 'l eta dell oro'."""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r'[^\w]+', " ", text).split())
+
+def _year_of(title: str, link: str) -> int | None:
+    found = _YEAR_RE.search(title) or _YEAR_RE.search(link.rstrip('/').rsplit('/', 1)[-1])
+    return int(found.group(1)) if found else None
+
+def _similar_words(tokens: list[str], vocabulary: set[str]) -> dict[str, dict[str, float]]:
+    """Per ogni parola cercata, le parole del catalogo simili almeno FUZZY_MIN_RATIO e la loro somiglianza."""
+    similar = {}
+    matcher = difflib.SequenceMatcher()
+    for token in tokens:
+        matcher.set_seq2(token)  # SequenceMatcher memorizza l'analisi della seconda sequenza
+        found = {}
+        for word in vocabulary:
+            if 2 * min(len(token), len(word)) < FUZZY_MIN_RATIO * (len(token) + len(word)): continue
+            matcher.set_seq1(word)
+            if matcher.quick_ratio() >= FUZZY_MIN_RATIO and (r := matcher.ratio()) >= FUZZY_MIN_RATIO: found[word] = r
+        similar[token] = found
+    return similar
+
+def _prefix_score(query: str, tokens: list[str], title: str, words: list[str], year: int | None) -> float:
+    """
+    1 se il titolo normalizzato è identico alla ricerca, 0.95 se inizia con la ricerca, 0.9 se ogni
+    parola cercata è l'inizio di una parola del titolo (un anno cercato vale anche come anno del titolo), altrimenti 0.
+    """
+    if title == query: return 1.0
+    if title.startswith(query + " ") or (title.startswith(query) and len(query) >= 3): return 0.95
+    if all(any(w.startswith(t) for w in words) or (year and t == str(year)) for t in tokens): return 0.9
+    return 0.0
+
+def _fuzzy_score(tokens: list[str], words: list[str], year: int | None, similar: dict[str, dict[str, float]]) -> float:
+    """Somiglianza media delle parole cercate con quelle del titolo, scalata a 0.8; 0 se una parola non ha corrispondenze."""
+    ratios = []
+    for token in tokens:
+        best = 1.0 if year and token == str(year) else max((similar[token].get(w, 0.0) for w in words), default=0.0)
+        if not best: return 0.0
+        ratios.append(best)
+    return 0.8 * sum(ratios) / len(ratios)
+
+class SearchIndex:
+    """
+    Titoli del catalogo e ricerche già eseguite, con validità `ttl_seconds`. Le voci scadute
+    vengono ignorate; con `refresh=True` le letture vengono saltate ma i dati nuovi salvati.
+    """
+
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH, ttl_seconds: float = 7 * 24 * 3600, refresh: bool = False):
+        self.conn = open_db(db_path)
+        self.conn.executescript(_SCHEMA)
+        self.ttl_seconds = ttl_seconds
+        self.refresh = refresh
+        self._titles: list[tuple] | None = None  # copia in memoria per le ricerche ripetute (modalità batch)
+        self._vocabulary: set[str] = set()
+
+    def _row_to_result(self, row: tuple) -> dict:
+        link, title, _, kind, year = row[:5]
+        return {'title': title, 'link': link, 'type': kind, 'year': year}
+
+    def _fresh_titles(self) -> list[tuple]:
+        if self._titles is None:
+            self._titles = [(*row, row[2].split()) for row in
+                            self.conn.execute("SELECT link, title, norm, type, year, seen_at FROM titles")]
+            self._vocabulary = {w for row in self._titles for w in row[6]}
+        oldest = time.time() - self.ttl_seconds
+        return [row for row in self._titles if row[5] >= oldest]
+
+    def add(self, results: list[dict], replace: bool = True) -> None:
+        """Salva dei risultati (title, link, type); con `replace=False` un titolo già noto resta com'è e ne viene solo rinnovata la data."""
+        now = time.time()
+        conflict = "title = excluded.title, norm = excluded.norm, type = excluded.type, year = excluded.year, " if replace else ""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO titles VALUES (?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT(link) DO UPDATE SET {conflict}seen_at = excluded.seen_at",
+                [(r['link'], r['title'], normalize(r['title']), r['type'], _year_of(r['title'], r['link']), now) for r in results])
+        self._titles = None
+
+    def add_search(self, query: str, results: list[dict]) -> None:
+        """Registra una ricerca fatta sul sito: i suoi risultati, nell'ordine del sito."""
+        self.add(results)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?)",
+                              (normalize(query), json.dumps([r['link'] for r in results]), time.time()))
+
+    def recorded(self, query: str) -> list[dict] | None:
+        """Risultati di una ricerca identica già fatta sul sito e non scaduta, nello stesso ordine."""
+        if self.refresh: return None
+        row = self.conn.execute("SELECT links, searched_at FROM searches WHERE query = ?", (normalize(query),)).fetchone()
+        if not row or time.time() - row[1] >= self.ttl_seconds: return None
+        by_link = {r[0]: r for r in self._fresh_titles()}
+        links = json.loads(row[0])
+        if not links or any(link not in by_link for link in links): return None
+        return [self._row_to_result(by_link[link]) for link in links]
+
+    def match(self, query: str, min_score: float = 0.0, limit: int = 20) -> list[dict]:
+        """
+        Titoli validi che corrispondono alla ricerca, dal migliore: prima identici o per prefisso;
+        solo se non ce ne sono, per somiglianza delle parole (errori di battitura).
+        """
+        if self.refresh: return []
+        query = normalize(query)
+        if not query: return []
+        tokens = list(dict.fromkeys(query.split()))
+        titles = self._fresh_titles()
+        scored = [(s, row) for row in titles if (s := _prefix_score(query, tokens, row[2], row[6], row[4]))]
+        if not scored and min_score < 0.9:
+            similar = _similar_words(tokens, self._vocabulary)
+            scored = [(s, row) for row in titles if (s := _fuzzy_score(tokens, row[6], row[4], similar))]
+        scored = [(s, row) for s, row in scored if s >= min_score]
+        scored.sort(key=lambda item: (-item[0], item[1][1]))
+        return [self._row_to_result(row) for _, row in scored[:limit]]
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,162 @@
+# Attese e tentativi adattivi per l'estrazione dei link dal browser.
+# Per ogni fase (caricamento della pagina, selettore del player, iframe...) si misura quanto
+# impiega davvero il sito: media mobile esponenziale (EWMA) con la sua deviazione, come per
+# il timeout di ritrasmissione TCP, e p95 degli ultimi campioni. Il timeout di ogni attesa è
+# ricavato da queste misure entro limiti fissi, e raddoppia a ogni timeout finché le risposte
+# non tornano regolari.
+# I nuovi tentativi attendono con backoff esponenziale e jitter e attingono a un budget per
+# esecuzione, così in una serata lenta non si spendono tutti i tentativi su ogni episodio.
+# I profili appresi vengono salvati nel database della cache e ripresi all'avvio successivo.
+
+import json
+import math
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from cache import DEFAULT_DB_PATH, open_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS timings (
+    stage TEXT PRIMARY KEY,
+    ewma REAL NOT NULL,
+    deviation REAL NOT NULL,
+    samples TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+@dataclass(frozen=True)
+class Stage:
+    """Timeout iniziale e limiti (ms) di una fase; `required` se un suo timeout fa fallire il tentativo."""
+    default_ms: float
+    min_ms: float
+    max_ms: float
+    required: bool = False
+
+# I valori iniziali sono quelli usati prima delle attese adattive.
+STAGES = {
+    'goto': Stage(4500, 1500, 30000, required=True),
+    'player_select': Stage(500, 300, 3000),
+    'player_nav': Stage(2000, 1000, 15000, required=True),
+    'player_image': Stage(1000, 300, 3000),
+    'iframe': Stage(3000, 1000, 15000, required=True),
+    'player_click': Stage(1000, 300, 5000),
+    'm3u8_wait': Stage(2000, 500, 10000),
+}
+
+MIN_SAMPLES = 5  # sotto questa soglia si usa il timeout iniziale della fase
+WINDOW = 50  # campioni recenti per il p95
+P95_MARGIN = 1.5
+DEVIATION_FACTOR = 4.0
+MAX_BACKOFF = 16.0  # dopo timeout consecutivi il limite è comunque il massimo della fase
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 8.0
+RETRY_BUDGET_MIN = 10  # nuovi tentativi sempre concessi, oltre alla quota in proporzione alle estrazioni
+
+def _p95(values) -> float:
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(0.95 * len(ordered))) - 1]
+
+class _StageStats:
+    def __init__(self, stage: Stage):
+        self.stage = stage
+        self.ewma: float | None = None  # secondi
+        self.deviation = 0.0
+        self.samples: deque[float] = deque(maxlen=WINDOW)
+        self.backoff = 1.0
+        self.timeouts = 0
+
+    def observe(self, seconds: float) -> None:
+        if self.ewma is None: self.ewma, self.deviation = seconds, seconds / 2
+        else:
+            self.deviation = 0.75 * self.deviation + 0.25 * abs(seconds - self.ewma)
+            self.ewma = 0.875 * self.ewma + 0.125 * seconds
+        self.samples.append(seconds)
+        self.backoff = max(1.0, self.backoff / 2)
+
+    def timed_out(self) -> None:
+        self.timeouts += 1
+        if self.stage.required: self.backoff = min(MAX_BACKOFF, self.backoff * 2)
+
+    def timeout_ms(self) -> float:
+        if len(self.samples) < MIN_SAMPLES: base = self.stage.default_ms
+        else: base = 1000 * max(P95_MARGIN * _p95(self.samples), self.ewma + DEVIATION_FACTOR * self.deviation)
+        return round(min(self.stage.max_ms, max(self.stage.min_ms, base) * self.backoff))
+
+class TimingPolicy:
+    """
+    Timeout per fase appresi dalle latenze osservate e budget dei nuovi tentativi.
+    Con `adaptive=False` restituisce sempre i timeout iniziali e non legge né salva profili.
+    """
+
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH, adaptive: bool = True, retry_budget: float = 0.5):
+        self.adaptive = adaptive
+        self.retry_budget = max(0.0, retry_budget)
+        self.stats = {name: _StageStats(stage) for name, stage in STAGES.items()}
+        self.extractions = 0
+        self.retries = 0
+        self.retries_denied = 0
+        self.conn = None
+        if adaptive:
+            self.conn = open_db(db_path)
+            self.conn.executescript(_SCHEMA)
+            for name, ewma, deviation, samples in self.conn.execute("SELECT stage, ewma, deviation, samples FROM timings"):
+                if name not in self.stats: continue
+                self.stats[name].ewma, self.stats[name].deviation = ewma, deviation
+                self.stats[name].samples.extend(json.loads(samples))
+
+    def timeout_ms(self, stage: str) -> float:
+        """Timeout in millisecondi (per Playwright) della fase."""
+        return self.stats[stage].timeout_ms() if self.adaptive else STAGES[stage].default_ms
+
+    def timeout(self, stage: str) -> float:
+        """Timeout in secondi (per asyncio) della fase."""
+        return self.timeout_ms(stage) / 1000
+
+    @contextmanager
+    def measure(self, stage: str):
+        """Registra la durata del blocco se termina senza errori; un timeout del blocco allunga temporaneamente i successivi."""
+        start = time.monotonic()
+        try: yield
+        except Exception as e:
+            # I timeout di Playwright hanno una classe propria chiamata anch'essa TimeoutError.
+            if isinstance(e, TimeoutError) or type(e).__name__ == 'TimeoutError': self.stats[stage].timed_out()
+            raise
+        self.stats[stage].observe(time.monotonic() - start)
+
+    def start_extraction(self) -> None:
+        self.extractions += 1
+
+    def allow_retry(self) -> bool:
+        """Concede un nuovo tentativo se il budget dell'esecuzione non è esaurito."""
+        if self.retries >= RETRY_BUDGET_MIN + self.retry_budget * self.extractions:
+            self.retries_denied += 1
+            return False
+        self.retries += 1
+        return True
+
+    def retry_delay(self, attempt: int) -> float:
+        """Attesa prima del tentativo `attempt` (1 = primo nuovo tentativo): backoff esponenziale con jitter."""
+        ceiling = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def summary(self) -> dict:
+        return {
+            'retries': self.retries, 'retries_denied': self.retries_denied,
+            'timeouts_ms': {name: self.timeout_ms(name) for name in STAGES},
+            'stage_timeouts': {name: s.timeouts for name, s in self.stats.items() if s.timeouts},
+        }
+
+    def close(self) -> None:
+        if self.conn is None: return
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO timings VALUES (?, ?, ?, ?, ?)",
+                                  [(name, s.ewma, s.deviation, json.dumps([round(x, 4) for x in s.samples]), now)
+                                   for name, s in self.stats.items() if s.ewma is not None])
+        self.conn.close()
+        self.conn = None